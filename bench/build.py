@@ -0,0 +1,188 @@
+#!/usr/bin/python3
+# encoding=utf-8
+"""
+Times configure.py on a synthetic lesson tree: autodiscover_lessons,
+configure_lessons and the create_makefile call it makes in a cold run (no
+state files), a warm run (one lesson changed) and a no-op run. With --build, also times full,
+incremental (one lesson or one shared input changed) and no-op builds of the
+slides, either through Configure.build_lessons or through the generated
+Makefile. Writes the results as JSON, so that runs can be compared across
+revisions.
+"""
+import argparse
+import contextlib
+import glob
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+from pipeline import revision, timed, summarize, compare
+import lessontree
+import configure as configuration
+
+STRATEGIES = ["configure", "make"]
+
+def resetTree(tree):
+    """
+    removes everything configure.py and the builds created in tree.
+    """
+    Configure = configuration.Configure
+    paths = [
+        os.path.join(tree, "configure.env"),
+        os.path.join(tree, Configure.DIGEST_DB_FILENAME),
+        os.path.join(tree, Configure.DEPS_CACHE_FILENAME),
+        os.path.join(tree, Configure.HISTORY_FILENAME),
+        os.path.join(tree, "Makefile"),
+        os.path.join(tree, "common", Configure.SLIDES_ENV_FILENAME),
+    ]
+    paths += glob.glob(os.path.join(tree, "common", Configure.PREAMBLE_FORMAT + ".*"))
+    paths += glob.glob(os.path.join(tree, Configure.LESSON_DIR, "*", "slides.*"))
+    for path in paths:
+        if os.path.exists(path):
+            os.unlink(path)
+
+def touch(path, counter=[0]):
+    counter[0] += 1
+    with open(path, "a") as f:
+        f.write("% edit {0}\n".format(counter[0]))
+
+def configurePhases(tree, env):
+    timings = {}
+    configure, timings["init"] = timed(lambda: configuration.Configure(tree, **env))
+    _, timings["autodiscover_lessons"] = timed(configure.autodiscover_lessons)
+    # configure_lessons writes the Makefile itself, so its timing includes
+    # create_makefile, which is timed from within that call
+    createMakefile = configure.create_makefile
+    def timedCreateMakefile():
+        _, timings["create_makefile"] = timed(createMakefile)
+    configure.create_makefile = timedCreateMakefile
+    _, timings["configure_lessons"] = timed(configure.configure_lessons)
+    return timings
+
+def runConfigure(tree, inputs, env):
+    timings = {}
+    resetTree(tree)
+    scenarios = [
+        ("cold", lambda: None),
+        ("warm", lambda: touch(os.path.join(tree, "lessons", "00", "document.tex"))),
+        ("noop", lambda: None),
+    ]
+    for scenario, prepare in scenarios:
+        prepare()
+        for phase, duration in configurePhases(tree, env).items():
+            timings["configure/{0}/{1}".format(scenario, phase)] = duration
+    return timings
+
+def build(tree, strategy, jobs, env):
+    if strategy == "make":
+        subprocess.check_call(["make", "-j", str(jobs), "slides"], cwd=tree,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    else:
+        configure = configuration.Configure(tree, **env)
+        configure.autodiscover_lessons()
+        configure.build_lessons(jobs=jobs)
+
+def runBuilds(tree, inputs, strategy, jobs, env):
+    timings = {}
+    resetTree(tree)
+    configure = configuration.Configure(tree, **env)
+    configure.autodiscover_lessons()
+    configure.configure_lessons()
+    shared = os.path.join(tree, lessontree.sharedPath(inputs[0][0])) if inputs[0] else None
+    scenarios = [
+        ("full", lambda: None),
+        ("noop", lambda: None),
+        ("lesson", lambda: touch(os.path.join(tree, "lessons", "00", "document.tex"))),
+        ("shared", lambda: shared and touch(shared)),
+    ]
+    for scenario, prepare in scenarios:
+        prepare()
+        _, timings["build/{0}/j{1}/{2}".format(strategy, jobs, scenario)] = timed(
+            lambda: build(tree, strategy, jobs, env))
+    return timings
+
+def runAll(tree, inputs, args, env):
+    timings = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        timings.update(runConfigure(tree, inputs, env))
+        if args.build:
+            for strategy in args.strategies:
+                for jobs in args.jobs:
+                    timings.update(runBuilds(tree, inputs, strategy, jobs, env))
+    return timings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-l", "--lessons", type=int, default=200)
+    parser.add_argument("-f", "--frames", type=int, default=20,
+        help="Number of frames per lesson.")
+    parser.add_argument("--shared", type=int, default=10,
+        help="Number of shared input files.")
+    parser.add_argument("--shared-per-lesson", type=int, default=3,
+        help="Number of shared input files every lesson inputs.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-n", "--runs", type=int, default=5,
+        help="Number of runs per phase.")
+    parser.add_argument("--build", action="store_true",
+        help="Time builds of the slides as well (requires pdflatex).")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=STRATEGIES,
+        help="How to build the slides with --build.")
+    parser.add_argument("-j", "--jobs", type=int, nargs="+", default=[1, os.cpu_count() or 1],
+        help="Numbers of parallel jobs to time the builds with.")
+    parser.add_argument("--no-preamble-format", dest="preambleFormat",
+        action="store_false", default=True,
+        help="Build without the precompiled preamble format.")
+    parser.add_argument("-o", "--output",
+        help="Write the results to this JSON file instead of stdout.")
+    parser.add_argument("--compare", metavar="JSON",
+        help="Print a comparison with the results of an earlier run.")
+    args = parser.parse_args()
+    if args.build and shutil.which(configuration.Configure.LATEX_COMMAND[0]) is None:
+        parser.error("--build requires {0}".format(configuration.Configure.LATEX_COMMAND[0]))
+    args.jobs = sorted(set(args.jobs))
+
+    logging.basicConfig(level=logging.ERROR)
+    env = {"preamble_format": args.preambleFormat, "cache_dir": None}
+
+    workdir = tempfile.mkdtemp(prefix="configure-bench-")
+    try:
+        tree = os.path.join(workdir, "tree")
+        inputs = lessontree.createLessonTree(tree, args.lessons, args.frames,
+            args.shared, args.shared_per_lesson, args.seed)
+        runs = [runAll(tree, inputs, args, env) for i in range(args.runs)]
+    finally:
+        shutil.rmtree(workdir)
+
+    result = {
+        "revision": revision(),
+        "python": platform.python_version(),
+        "parameters": {
+            "lessons": args.lessons,
+            "frames": args.frames,
+            "shared": args.shared,
+            "sharedPerLesson": args.shared_per_lesson,
+            "seed": args.seed,
+            "build": args.build,
+            "strategies": args.strategies if args.build else [],
+            "jobs": args.jobs if args.build else [],
+            "preambleFormat": args.preambleFormat,
+        },
+        "timings": summarize(runs),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare, "r") as f:
+            compare(json.load(f), result)
@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+# encoding=utf-8
+"""
+Micro-benchmark for the commit line classifier of eval.py. Compares the
+single-pass classifyLine() with the former cascade of looseMatch, ignore,
+extractCommitId and corrected on a synthetic log, after checking that both
+classify every line identically.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import eval as evaluation
+
+looseMatch = re.compile(r"[0-9a-f]{40} (Amm?ended correction|corrected|imported).*", re.I)
+ignore = re.compile(r"[0-9a-f]{40} (Merge|((Amm?ended )?[Ss]ubmission|\[ignore\])).*", re.I)
+extractCommitId = re.compile(r"^[0-9a-f]{40}", re.I)
+corrected = re.compile(r"([0-9a-fA-F]{40}) (Amm?ended correction( of)?|corrected|imported):? (([0-9]{1,2})/(\w+)|(\w+)/([0-9]{1,2}))\W?\s*(([0-9.]+)\s*\+\s*([0-9.]+)\s*=)?\s*([0-9.]+)?(\s+pts)?(!)?", re.I)
+
+def legacyClassifyLine(line):
+    """
+    the classification parseCommits() used to do, returning the same tuples
+    as evaluation.classifyLine().
+    """
+    if looseMatch.match(line) is None:
+        commitIdMatch = extractCommitId.search(line)
+        commitId = commitIdMatch.group(0) if commitIdMatch is not None else None
+        if ignore.match(line) is not None or len(line.rstrip().lstrip()) == 0:
+            return (evaluation.LINE_IGNORED, commitId, None)
+        if commitId is None or not commitId in evaluation.commitWhitelist:
+            return (evaluation.LINE_UNRECOGNIZED, commitId, None)
+        return (evaluation.LINE_WHITELISTED, commitId, None)
+    match = corrected.match(line)
+    if match is None:
+        return (evaluation.LINE_MALFORMED, extractCommitId.search(line).group(0), None)
+    groups = match.groups()
+    if groups[0] in evaluation.commitWhitelist:
+        return (evaluation.LINE_WHITELISTED, groups[0], None)
+    if groups[4] is None:
+        unit = int(groups[7])
+        person = groups[6]
+    else:
+        unit = int(groups[4])
+        person = groups[5]
+    points = None
+    style = 0
+    if unit >= evaluation.MIN_UNIT:
+        if groups[-2] is None:
+            points = float(groups[-4]) + float(groups[-3])
+            style = float(groups[-3])
+        else:
+            points = float(groups[-2])
+    return (evaluation.LINE_CORRECTION, groups[0], (unit, person, points, style, groups[-1] == "!"))
+
+SUBJECTS = [
+    "Corrected {unit}/{name}: {a} + {b} = {total}",
+    "corrected {name}/{unit}: {a}+{b}={total}",
+    "Amended correction of {unit}/{name}: {a} + {b} = {total}",
+    "Ammended correction {unit}/{name}: {a} + {b} = {total}!",
+    "Imported {unit}/{name}: {a} + {b} = {total}",
+    "Corrected {small}/{name}: {a}",
+    "Submission {unit}/{name}",
+    "Amended submission {unit}/{name}",
+    "Merge branch '{name}'",
+    "[ignore] fix typo",
+    "Update README",
+    "Corrected the build",
+    "",
+]
+
+def syntheticLog(count, seed=0):
+    rng = random.Random(seed)
+    names = ["student{0}".format(i) for i in range(200)]
+    for i in range(count):
+        a = rng.randint(0, 5)
+        b = rng.choice([0, 0.5, 1])
+        subject = rng.choice(SUBJECTS).format(
+            unit=rng.randint(3, 13),
+            small=rng.randint(0, 2),
+            name=rng.choice(names),
+            a=a,
+            b=b,
+            total=a+b
+        )
+        if subject:
+            yield "{0:040x} {1}".format(rng.getrandbits(160), subject)
+        else:
+            yield subject
+
+def linesPerSecond(classify, lines):
+    start = time.perf_counter()
+    for line in lines:
+        classify(line)
+    return len(lines) / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-n", "--lines",
+        type=int,
+        default=2000000,
+        help="Number of synthetic log lines."
+    )
+    args = parser.parse_args()
+
+    lines = list(syntheticLog(args.lines))
+    # whitelist a few commits to exercise that path as well
+    evaluation.commitWhitelist.extend(line[:40] for line in lines[::997] if line)
+    for line in lines:
+        expected = legacyClassifyLine(line)
+        actual = evaluation.classifyLine(line)
+        if expected != actual:
+            print("mismatch on {0!r}: {1!r} != {2!r}".format(line, expected, actual), file=sys.stderr)
+            sys.exit(1)
+
+    before = linesPerSecond(legacyClassifyLine, lines)
+    after = linesPerSecond(evaluation.classifyLine, lines)
+    print("{0} lines".format(len(lines)))
+    print("cascade:     {0:12.0f} lines/s".format(before))
+    print("single pass: {0:12.0f} lines/s".format(after))
+    print("speedup:     {0:12.2f}x".format(after / before))
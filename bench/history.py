@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+# encoding=utf-8
+"""
+Generates throwaway grading repositories for benchmarks.
+
+For every unit, each student's submission is committed on a unit branch
+which is then merged; the corrections follow on master in all the formats
+eval.py evaluates, some of them amended later on. A bit of unrelated noise
+is mixed in as well.
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+
+CORRECTION_FORMATS = [
+    "Corrected {unit}/{name}: {a} + {b} = {total}",
+    "corrected {name}/{unit}: {a}+{b}={total}",
+    "Imported {unit}/{name}: {a} + {b} = {total}",
+]
+AMENDMENT_FORMATS = [
+    "Amended correction of {unit}/{name}: {a} + {b} = {total}",
+    "Ammended correction {name}/{unit}: {a} + {b} = {total}",
+]
+ZERO_FORMATS = [
+    "Corrected {unit}/{name}: 0 + 0 = 0!",
+    "Corrected {unit}/{name}: 0 + 0 = 0",
+]
+# below MIN_UNIT only the unit and the name are evaluated
+UNGRADED_FORMAT = "Corrected {unit}/{name}: {a}"
+NOISE = [
+    "Update task sheet",
+    "[ignore] fix typo in task sheet",
+]
+
+class HistoryWriter(object):
+    """
+    writes a git fast-import stream of empty commits.
+    """
+    def __init__(self, stream, timestamp):
+        self.stream = stream
+        self.timestamp = timestamp
+        self.mark = 0
+        self.commitCount = 0
+
+    def commit(self, branch, message, parent=None, merge=None):
+        self.mark += 1
+        self.timestamp += 60
+        self.commitCount += 1
+        data = message.encode("utf-8")
+        self.stream.write("commit refs/heads/{0}\nmark :{1}\n".format(branch, self.mark).encode("ascii"))
+        self.stream.write("committer Tutor <tutor@example.com> {0} +0000\n".format(self.timestamp).encode("ascii"))
+        self.stream.write("data {0}\n".format(len(data)).encode("ascii") + data + b"\n")
+        if parent is not None:
+            self.stream.write("from :{0}\n".format(parent).encode("ascii"))
+        if merge is not None:
+            self.stream.write("merge :{0}\n".format(merge).encode("ascii"))
+        return self.mark
+
+def writeHistory(writer, students, units, seed=0, amendRatio=0.1, zeroRatio=0.02):
+    rng = random.Random(seed)
+    names = ["student{0:04d}".format(i) for i in range(students)]
+    head = writer.commit("master", "Initial commit")
+    for unit in range(1, units + 1):
+        branch = "unit-{0:02d}".format(unit)
+        tip = head
+        for name in names:
+            tip = writer.commit(branch, "Submission {0}/{1}".format(unit, name), tip)
+        head = writer.commit("master", "Merge branch '{0}'".format(branch), head, tip)
+        for name in names:
+            a = rng.randint(0, 5)
+            b = rng.choice([0, 0.5, 1])
+            if unit < 3:
+                message = UNGRADED_FORMAT.format(unit=unit, name=name, a=a)
+            elif rng.random() < zeroRatio:
+                message = rng.choice(ZERO_FORMATS).format(unit=unit, name=name)
+            else:
+                message = rng.choice(CORRECTION_FORMATS).format(unit=unit, name=name, a=a, b=b, total=a+b)
+            head = writer.commit("master", message, head)
+        for name in names:
+            if unit >= 3 and rng.random() < amendRatio:
+                a = rng.randint(0, 5)
+                message = rng.choice(AMENDMENT_FORMATS).format(unit=unit, name=name, a=a, b=1, total=a+1)
+                head = writer.commit("master", message, head)
+        head = writer.commit("master", rng.choice(NOISE), head)
+    return writer.commitCount
+
+def createHistory(path, students, units, seed=0):
+    """
+    creates a new repository at path and returns the number of commits.
+    """
+    subprocess.check_call(["git", "init", "-q", path])
+    subprocess.check_call(["git", "symbolic-ref", "HEAD", "refs/heads/master"], cwd=path)
+    git = subprocess.Popen(["git", "fast-import", "--quiet"], cwd=path,
+        stdin=subprocess.PIPE)
+    writer = HistoryWriter(git.stdin, 1500000000)
+    count = writeHistory(writer, students, units, seed)
+    git.stdin.close()
+    if git.wait() != 0:
+        raise subprocess.CalledProcessError(git.returncode, "git fast-import")
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="Where to create the repository.")
+    parser.add_argument("-s", "--students", type=int, default=100)
+    parser.add_argument("-u", "--units", type=int, default=13)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if os.path.exists(args.path):
+        parser.error("{0} exists already".format(args.path))
+    count = createHistory(args.path, args.students, args.units, args.seed)
+    print("created {0} commits in {1}".format(count, args.path), file=sys.stderr)
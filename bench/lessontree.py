@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+# encoding=utf-8
+"""
+Generates throwaway lesson trees for benchmarks.
+
+The tree gets a copy of the common preamble files of this repository, a
+number of shared inputs below common/shared/ and one lessons/NN directory
+per lesson. Every document.tex has the requested number of frames, inputs
+a few of the shared files and a file of its own, so that the dependency
+scanner has something to follow.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMON_FILES = ["slides-head.tex", "slides-conf.tex"]
+
+FRAME = r"""
+    \begin{{frame}}
+        \frametitle{{Frame {frame} of lesson {lesson}}}
+        \begin{{itemize}}
+            \item Lorem ipsum dolor sit amet, consectetur adipiscing elit.
+            \item Sed do eiusmod tempor incididunt ut labore {word}.
+            \item See section~\ref{{sec:{lesson}-{section}}}.
+        \end{{itemize}}
+    \end{{frame}}
+"""
+SECTION = r"""
+    \section{{Section {section}}}\label{{sec:{lesson}-{section}}}\subsection{{~}}
+"""
+WORDS = ["et dolore", "magna aliqua", "ut enim", "ad minim", "veniam"]
+
+def writeFile(path, content):
+    with open(path, "w") as f:
+        f.write(content)
+
+def sharedPath(index):
+    return os.path.join("common", "shared", "shared{0:02d}.tex".format(index))
+
+def lessonDocument(lesson, frames, shared, rng):
+    parts = [
+        "\\title{{Lesson {0}}}\n\n\\begin{{document}}\n".format(lesson),
+        "    \\begin{frame}\n        \\frontframe\n    \\end{frame}\n",
+    ]
+    for index in shared:
+        parts.append("    \\input{{../../{0}}}\n".format(sharedPath(index)))
+    parts.append("    \\input{local.tex}\n")
+    for frame in range(frames):
+        if frame % 5 == 0:
+            parts.append(SECTION.format(lesson=lesson, section=frame // 5))
+        parts.append(FRAME.format(lesson=lesson, frame=frame, section=frame // 5,
+            word=rng.choice(WORDS)))
+    parts.append("\\end{document}\n")
+    return "".join(parts)
+
+def createLessonTree(path, lessons, frames=20, sharedFiles=10, sharedPerLesson=3, seed=0):
+    """
+    creates a new lesson tree at path and returns the list of shared files
+    each lesson inputs.
+    """
+    rng = random.Random(seed)
+    common = os.path.join(path, "common")
+    os.makedirs(os.path.join(common, "shared"))
+    for filename in COMMON_FILES:
+        shutil.copy(os.path.join(BASE_PATH, "common", filename), common)
+    for index in range(sharedFiles):
+        writeFile(os.path.join(path, sharedPath(index)),
+            "\\newcommand{{\\sharedmacro{0}}}{{shared {0}}}\n".format(
+                "abcdefghijklmnopqrstuvwxyz"[index % 26] * (index // 26 + 1)))
+    inputs = []
+    for lesson in range(lessons):
+        lessonPath = os.path.join(path, "lessons", "{0:02d}".format(lesson))
+        os.makedirs(lessonPath)
+        shared = sorted(rng.sample(range(sharedFiles), min(sharedPerLesson, sharedFiles)))
+        writeFile(os.path.join(lessonPath, "local.tex"),
+            "\\newcommand{{\\lessonmacro}}{{lesson {0}}}\n".format(lesson))
+        writeFile(os.path.join(lessonPath, "document.tex"),
+            lessonDocument(lesson, frames, shared, rng))
+        inputs.append(shared)
+    return inputs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="Where to create the lesson tree.")
+    parser.add_argument("-l", "--lessons", type=int, default=100)
+    parser.add_argument("-f", "--frames", type=int, default=20,
+        help="Number of frames per lesson.")
+    parser.add_argument("--shared", type=int, default=10,
+        help="Number of shared input files.")
+    parser.add_argument("--shared-per-lesson", type=int, default=3,
+        help="Number of shared input files every lesson inputs.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if os.path.exists(args.path):
+        parser.error("{0} exists already".format(args.path))
+    createLessonTree(args.path, args.lessons, args.frames, args.shared,
+        args.shared_per_lesson, args.seed)
+    print("created {0} lessons in {1}".format(args.lessons, args.path), file=sys.stderr)
@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+# encoding=utf-8
+"""
+Compares reading commit subjects through git log with reading them directly
+from the object store, both in-process and as complete eval.py runs.
+
+Run it from inside (or point it at) a grading repository.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+import gitobjects
+
+def subprocessLog():
+    git = subprocess.Popen(["git", "log", "--format=oneline"],
+        stdout=subprocess.PIPE)
+    count = sum(1 for line in git.stdout)
+    git.wait()
+    return count
+
+def objectStoreLog():
+    repository = gitobjects.Repository.discover()
+    return sum(1 for commit in repository.walk([repository.resolve("HEAD")]))
+
+def evalRun(*extraArgs):
+    subprocess.check_call(
+        [sys.executable, os.path.join(BASE_PATH, "eval.py"), "--csv"] + list(extraArgs),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL)
+
+def measure(func, runs):
+    timings = []
+    for i in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "repository",
+        nargs="?",
+        default=os.getcwd(),
+        help="Repository to read. Defaults to the current directory."
+    )
+    parser.add_argument(
+        "-n", "--runs",
+        type=int,
+        default=10,
+        help="Number of runs per measurement."
+    )
+    args = parser.parse_args()
+    os.chdir(args.repository)
+
+    if subprocessLog() != objectStoreLog():
+        print("warn: git log and the object store reader disagree on the commit count", file=sys.stderr)
+
+    benchmarks = [
+        ("git log subprocess", subprocessLog),
+        ("object store reader", objectStoreLog),
+        ("eval.py", lambda: evalRun()),
+        ("eval.py --native", lambda: evalRun("--native")),
+    ]
+    print("{0:24s} {1:>10s} {2:>10s}".format("", "min [ms]", "avg [ms]"))
+    for name, func in benchmarks:
+        best, avg = measure(func, args.runs)
+        print("{0:24s} {1:10.2f} {2:10.2f}".format(name, best*1000, avg*1000))
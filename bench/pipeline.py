@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+# encoding=utf-8
+"""
+Times the phases of eval.py (parseCommits, filterAcknowledgements,
+getPersonData and printData) separately on a synthetic grading history and
+writes the results as JSON, so that runs can be compared across revisions.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+import eval as evaluation
+import history
+
+def revision():
+    try:
+        return subprocess.check_output(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=BASE_PATH, stderr=subprocess.DEVNULL).decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+def runPipeline(repository, native=False, columnar=False):
+    timings = {}
+    with open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(devnull), \
+            contextlib.redirect_stderr(devnull):
+        acknowledgements, timings["parseCommits"] = timed(
+            lambda: list(evaluation.parseCommits(native=native, repository=repository)))
+        acknowledgements, timings["filterAcknowledgements"] = timed(
+            lambda: list(evaluation.filterAcknowledgements(acknowledgements)))
+        (personData, maxUnit, maxNameLen), timings["getPersonData"] = timed(
+            lambda: evaluation.getPersonData(acknowledgements, columnar))
+        _, timings["printData"] = timed(
+            lambda: evaluation.printData(personData, maxUnit, maxNameLen, True))
+    return timings
+
+def summarize(runs):
+    summary = {}
+    for phase in runs[0]:
+        values = [run[phase] for run in runs]
+        summary[phase] = {
+            "min": min(values),
+            "mean": sum(values) / len(values),
+            "runs": values,
+        }
+    return summary
+
+def compare(previous, current):
+    width = max([24] + [len(phase) for phase in current["timings"]])
+    print("{0:{w}s} {1:>12s} {2:>12s} {3:>8s}".format("phase", "before [ms]", "after [ms]", "ratio", w=width))
+    for phase, timing in current["timings"].items():
+        try:
+            before = previous["timings"][phase]["min"]
+        except KeyError:
+            continue
+        after = timing["min"]
+        print("{0:{w}s} {1:12.2f} {2:12.2f} {3:8.2f}".format(
+            phase, before*1000, after*1000, after / before if before else float("nan"), w=width))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-s", "--students", type=int, default=200)
+    parser.add_argument("-u", "--units", type=int, default=13)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-n", "--runs", type=int, default=5,
+        help="Number of runs per phase.")
+    parser.add_argument("--native", action="store_true",
+        help="Read the history with the object store reader.")
+    parser.add_argument("--columnar", action="store_true",
+        help="Use the columnar cohort backend.")
+    parser.add_argument("-o", "--output",
+        help="Write the results to this JSON file instead of stdout.")
+    parser.add_argument("--compare", metavar="JSON",
+        help="Print a comparison with the results of an earlier run.")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="eval-bench-")
+    try:
+        repository = os.path.join(workdir, "history")
+        commitCount = history.createHistory(repository, args.students, args.units, args.seed)
+        runs = [runPipeline(repository, args.native, args.columnar) for i in range(args.runs)]
+    finally:
+        shutil.rmtree(workdir)
+
+    result = {
+        "revision": revision(),
+        "python": platform.python_version(),
+        "parameters": {
+            "students": args.students,
+            "units": args.units,
+            "seed": args.seed,
+            "commits": commitCount,
+            "native": args.native,
+            "columnar": args.columnar,
+        },
+        "timings": summarize(runs),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare, "r") as f:
+            compare(json.load(f), result)
@@ -4,76 +4,706 @@ import logging
 import sys
 import argparse
 import pickle
+import hashlib
+import re
+import subprocess
+import threading
+import time
+import shutil
+import select
+import struct
+import concurrent.futures
 
-def file_timestamp(path):
-    st = os.stat(path)
-    return st.st_mtime
+def data_digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_atomic(path, data):
+    """
+    Replace the file *path* with *data* atomically: readers see either the
+    old or the new content, never a partially written file.
+    """
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def write_if_changed(path, data, force=False):
+    """
+    Atomically replace *path* with *data* unless it already has exactly that
+    content, in which case neither the file nor its timestamp is touched
+    (with *force*, the file is replaced anyway). Return whether the file was
+    written.
+    """
+    if not force:
+        try:
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return False
+        except (IOError, OSError):
+            pass
+    write_atomic(path, data)
+    return True
+
+class DigestDB:
+    """
+    Persistent map from names (usually paths relative to the base path) to
+    SHA-1 digests. It remembers the contents of the files configure.py
+    generated and the inputs each lesson was last built from, so that
+    nothing depends on modification times.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.digests = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, "rb") as f:
+                    self.digests = pickle.load(f)
+            except (IOError, OSError, EOFError, pickle.UnpicklingError) as err:
+                logging.warn("could not restore digest database: %s", err)
+
+    def get(self, key):
+        return self.digests.get(key)
+
+    def set(self, key, digest):
+        self.digests[key] = digest
+
+    def discard(self, key):
+        self.digests.pop(key, None)
+
+    def save(self):
+        try:
+            write_if_changed(self.path, pickle.dumps(self.digests))
+        except (IOError, OSError) as err:
+            logging.warn("could not save digest database: %s", err)
+
+class DependencyScanner:
+    """
+    Finds the files a TeX document depends on by following \\input,
+    \\include, \\includegraphics, \\lstinputlisting and similar commands
+    recursively. The references of every TeX file are cached, keyed by the
+    digest of its content, so that a rescan only parses the files which
+    changed and touching a file does not invalidate anything.
+    """
+
+    REFERENCE_RE = re.compile(
+        r"\\(?:(input|include|subfile)"
+        r"|(includegraphics|includepdf|lstinputlisting|verbatiminput|VerbatimInput)"
+        r"|inputminted(?:\[[^\]]*\])?\s*\{[^}]*\})"
+        r"\*?\s*(?:\[[^\]]*\]\s*)?\{([^}]+)\}"
+    )
+    COMMENT_RE = re.compile(r"(?<!\\)%.*")
+    TEX_EXTENSIONS = [".tex", ""]
+    GRAPHICS_EXTENSIONS = ["", ".pdf", ".png", ".jpg", ".jpeg", ".eps", ".mps"]
+
+    def __init__(self, base_path, cache_file):
+        self.base_path = base_path
+        self.cache_file = cache_file
+        self.cache = {}
+        self.used = set()
+        if os.path.isfile(self.cache_file):
+            try:
+                with open(self.cache_file, "rb") as f:
+                    self.cache = pickle.load(f)
+            except (IOError, OSError, EOFError, pickle.UnpicklingError) as err:
+                logging.warn("could not restore dependency cache: %s", err)
+
+    def save(self):
+        try:
+            write_if_changed(self.cache_file, pickle.dumps(self.cache))
+        except (IOError, OSError) as err:
+            logging.warn("could not save dependency cache: %s", err)
+
+    def prune(self):
+        """
+        Forget the references of all contents which have not been scanned
+        since the cache was loaded.
+        """
+        self.cache = dict(
+            (digest, references) for digest, references in self.cache.items()
+            if digest in self.used
+        )
+
+    def entry(self, path, parse):
+        """
+        Return the digest and the references of *path*. The references are
+        only extracted if *parse* is true, otherwise they are None.
+        """
+        if not parse:
+            return file_digest(path), None
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = data_digest(data)
+        self.used.add(digest)
+        references = self.cache.get(digest)
+        if references is None:
+            text = self.COMMENT_RE.sub("", data.decode("utf-8", errors="replace"))
+            references = self.cache[digest] = [
+                (bool(match.group(1)), match.group(3).strip())
+                for match in self.REFERENCE_RE.finditer(text)
+            ]
+        return digest, references
+
+    def resolve(self, directory, name, is_tex):
+        extensions = self.TEX_EXTENSIONS if is_tex else self.GRAPHICS_EXTENSIONS
+        for ext in extensions:
+            candidate = os.path.normpath(os.path.join(directory, name + ext))
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def scan_with_digests(self, root):
+        """
+        Return a dict mapping every file *root* depends on, including
+        itself, to the digest of its content. Every file is read once.
+        Relative references are resolved against the directory of *root*,
+        where LaTeX runs; references which cannot be found (e.g. files from
+        the TeX distribution) are skipped.
+        """
+        directory = os.path.dirname(root)
+        root = os.path.normpath(root)
+        found = {}
+        found[root], references = self.entry(root, True)
+        pending = [(root, references)]
+        while pending:
+            path, references = pending.pop()
+            for is_tex, name in references:
+                dependency = self.resolve(directory, name, is_tex)
+                if dependency is None:
+                    logging.debug("%s: cannot find `%s', ignoring it", path, name)
+                    continue
+                if dependency in found:
+                    continue
+                found[dependency], dependency_references = self.entry(dependency, is_tex)
+                if is_tex:
+                    pending.append((dependency, dependency_references))
+        return found
+
+    def scan(self, root):
+        """
+        Return the sorted list of files *root* depends on, including itself.
+        """
+        return sorted(self.scan_with_digests(root))
+
+class PollingWatcher:
+    """
+    Detects changes to a set of files and to the entries of a set of
+    directories by comparing their size and modification time (resp. their
+    listing) every *interval* seconds.
+    """
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.files = set()
+        self.directories = set()
+        self.state = {}
+
+    def close(self):
+        pass
+
+    def stamp(self, path):
+        if path in self.directories:
+            try:
+                return tuple(sorted(os.listdir(path)))
+            except OSError:
+                return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def watch(self, files, directories):
+        """
+        Watch exactly *files* and *directories* from now on. Paths which
+        were already watched keep their state, so that changes made between
+        two calls to :meth:`wait` are not lost.
+        """
+        self.files = set(files)
+        self.directories = set(directories)
+        self.state = dict(
+            (path, self.state[path] if path in self.state else self.stamp(path))
+            for path in self.files | self.directories
+        )
+
+    def wait(self, timeout=None):
+        """
+        Block until some of the watched paths changed or *timeout* seconds
+        passed. Return the set of changed paths (empty on timeout).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = set()
+            for path, stamp in self.state.items():
+                current = self.stamp(path)
+                if current != stamp:
+                    self.state[path] = current
+                    changed.add(path)
+            if changed:
+                return changed
+            if deadline is None:
+                time.sleep(self.interval)
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return changed
+                time.sleep(min(self.interval, remaining))
+
+class InotifyWatcher:
+    """
+    Same interface as :class:`PollingWatcher`, but sleeps in the kernel until
+    something happens, using inotify through ctypes. Only the directories
+    containing the watched paths are watched, since editors commonly save by
+    writing a new file and renaming it over the old one. Raises OSError if
+    inotify is not available.
+    """
+
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self.ctypes = ctypes
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        try:
+            self.libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        except AttributeError:
+            raise OSError("inotify is not supported by the C library")
+        self.fd = self.libc.inotify_init1(self.IN_CLOEXEC)
+        if self.fd < 0:
+            self.raise_errno()
+        self.files = set()
+        self.directories = set()
+        self.watches = {}
+
+    def raise_errno(self, path=None):
+        errno = self.ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno), path)
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def watch(self, files, directories):
+        self.files = set(files)
+        self.directories = set(directories)
+        wanted = set(os.path.dirname(path) for path in self.files) | self.directories
+        for wd, directory in list(self.watches.items()):
+            if directory not in wanted:
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+        watched = set(self.watches.values())
+        for directory in wanted - watched:
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+            if wd < 0:
+                logging.warning("cannot watch `%s': %s", directory,
+                                os.strerror(self.ctypes.get_errno()))
+                continue
+            self.watches[wd] = directory
+
+    def read_events(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return None
+        data = os.read(self.fd, 65536)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = os.fsdecode(data[offset:offset+length].rstrip(b"\0"))
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                # events were lost, assume everything changed
+                changed |= self.files | self.directories
+            elif mask & self.IN_IGNORED:
+                self.watches.pop(wd, None)
+            elif wd in self.watches:
+                directory = self.watches[wd]
+                path = os.path.join(directory, name)
+                if path in self.files:
+                    changed.add(path)
+                if directory in self.directories:
+                    changed.add(directory)
+        return changed
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            changed = self.read_events(remaining)
+            if changed is None or changed:
+                return changed or set()
+
+def create_watcher(poll=False, interval=0.5):
+    """
+    Return an :class:`InotifyWatcher` if possible, a :class:`PollingWatcher`
+    otherwise or if *poll* is set.
+    """
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher()
+        except OSError as err:
+            logging.info("inotify unavailable (%s), polling instead", err)
+    return PollingWatcher(interval)
+
+class ArtifactCache:
+    """
+    Content-addressed store for build results which can be shared between
+    checkouts. Every entry is a directory named after the key it was stored
+    under, holding copies of the output files of one build. Entries are
+    inserted atomically by renaming a temporary directory, and the least
+    recently used entries are evicted once the cache grows beyond
+    *max_size* bytes.
+    """
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+
+    def entry_path(self, key):
+        return os.path.join(self.path, key[:2], key[2:])
+
+    def restore(self, key, directory):
+        """
+        Copy the files stored under *key* into *directory*. Return whether
+        the key was found and restored completely.
+        """
+        entry = self.entry_path(key)
+        try:
+            names = os.listdir(entry)
+            for name in names:
+                with open(os.path.join(entry, name), "rb") as f:
+                    write_atomic(os.path.join(directory, name), f.read())
+            os.utime(entry)
+        except (IOError, OSError) as err:
+            if os.path.isdir(entry):
+                logging.warning("could not restore %s from the cache: %s", key, err)
+            return False
+        return bool(names)
+
+    def store(self, key, files):
+        """
+        Store copies of *files* under *key* (if it is not stored yet), then
+        evict old entries if necessary.
+        """
+        entry = self.entry_path(key)
+        if os.path.isdir(entry):
+            return
+        tmp_path = "{}.{}.tmp".format(entry, os.getpid())
+        try:
+            os.makedirs(tmp_path)
+            for path in files:
+                shutil.copyfile(path, os.path.join(tmp_path, os.path.basename(path)))
+            os.rename(tmp_path, entry)
+        except (IOError, OSError) as err:
+            if not os.path.isdir(entry):
+                logging.warning("could not store %s in the cache: %s", key, err)
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+        self.evict()
+
+    def entries(self):
+        """
+        Return a list of (last use, size, path) of all entries.
+        """
+        entries = []
+        for prefix in os.listdir(self.path):
+            prefix_path = os.path.join(self.path, prefix)
+            if not os.path.isdir(prefix_path):
+                continue
+            for name in os.listdir(prefix_path):
+                entry = os.path.join(prefix_path, name)
+                if name.endswith(".tmp"):
+                    continue
+                try:
+                    size = sum(
+                        os.path.getsize(os.path.join(entry, filename))
+                        for filename in os.listdir(entry)
+                    )
+                    entries.append((os.stat(entry).st_mtime, size, entry))
+                except OSError:
+                    # evicted by another process in the meantime
+                    continue
+        return entries
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_size:
+                break
+            logging.debug("evicting %s from the cache", entry)
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+class BuildHistory:
+    """
+    Persistent record of the last *keep* successful builds of every lesson,
+    keyed by the lesson path relative to the base path. Each record is a
+    dict with the time of the build, the wall time of every LaTeX pass, the
+    total wall time, the page count and the size of the PDF.
+    """
+
+    REGRESSION_THRESHOLD = 1.2
+
+    def __init__(self, path, keep=20):
+        self.path = path
+        self.keep = keep
+        self.history = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, "rb") as f:
+                    self.history = pickle.load(f)
+            except (IOError, OSError, EOFError, pickle.UnpicklingError) as err:
+                logging.warn("could not restore build history: %s", err)
+
+    def add(self, key, record):
+        records = self.history.setdefault(key, [])
+        records.append(record)
+        del records[:-self.keep]
+
+    def records(self, key):
+        return self.history.get(key, [])
+
+    def save(self):
+        try:
+            write_if_changed(self.path, pickle.dumps(self.history))
+        except (IOError, OSError) as err:
+            logging.warn("could not save build history: %s", err)
+
+    def print_report(self, limit=10):
+        """
+        Print the lessons whose last build took longest, and the lessons
+        whose last build was more than REGRESSION_THRESHOLD times slower
+        than the median of their earlier builds.
+        """
+        latest = []
+        regressions = []
+        for key, records in sorted(self.history.items()):
+            if not records:
+                continue
+            last = records[-1]
+            earlier = sorted(record["total"] for record in records[:-1])
+            median = earlier[len(earlier) // 2] if earlier else None
+            latest.append((last["total"], key, last, median))
+            if median and last["total"] > self.REGRESSION_THRESHOLD * median:
+                regressions.append((last["total"] / median, key, last, median))
+        if not latest:
+            print("No builds recorded yet, run configure.py --build or --watch first.")
+            return
+        row = "{0:16s} {1:>9s} {2:>7s} {3:>6s} {4:>6s} {5:>9s} {6:>10s}"
+        header = row.format("lesson", "time [s]", "passes", "pages", "size",
+                            "median", "change")
+
+        def print_rows(rows):
+            print(header)
+            for _, key, last, median in rows:
+                print(row.format(
+                    key,
+                    "{:.2f}".format(last["total"]),
+                    str(len(last["passes"])),
+                    "-" if last["pages"] is None else str(last["pages"]),
+                    "-" if last["size"] is None else "{}k".format(last["size"] // 1024),
+                    "-" if median is None else "{:.2f}".format(median),
+                    "-" if not median else "{:+.0%}".format(last["total"] / median - 1),
+                ))
+
+        print("Slowest lessons (last build):")
+        print_rows(sorted(latest, reverse=True)[:limit])
+        if regressions:
+            print()
+            print("Regressions (more than {:.0%} slower than the median of earlier builds):".format(
+                self.REGRESSION_THRESHOLD - 1))
+            print_rows(sorted(regressions, reverse=True))
 
 class Incomplete(Exception):
     pass
 
+class BuildFailed(Exception):
+    def __init__(self, failed):
+        super().__init__("lessons failed to build: {}".format(
+            ", ".join(str(lesson_no) for lesson_no in failed)
+        ))
+        self.failed = failed
+
+def latex_errors(output, context=2):
+    """
+    Extract the error messages (lines starting with ``!``, plus a few lines
+    of context) from the terminal output of a LaTeX run.
+    """
+    lines = output.splitlines()
+    errors = []
+    for i, line in enumerate(lines):
+        if line.startswith("!"):
+            errors.extend(lines[i:i+context+1])
+    return errors
+
 class Configure:
     LESSON_DIR = "lessons"
     DOCUMENT_FILENAME = "document.tex"
     SLIDES_ENV_FILENAME = "slides-env.tex"
     SLIDES_FILENAME = "slides.tex"
+    DEPENDENCY_FILENAME = "slides.d"
     SLIDES_ENV_TEMPLATE = r"""
 \newcommand{{\authorname}}{{{author_name}}}
 \newcommand{{\authormail}}{{\texttt{{<{author_mail}>}}}}
 \newcommand{{\extratitlepageline}}{{{extra_line}}}
 \usetheme{{{theme}}}
 """
+    # everything up to \endofdump is skipped when the slides are compiled
+    # with the preamble format; without it, \csname endofdump\endcsname is
+    # just \relax. slides-conf.tex may use \lessonno, so it stays after it
+    # and is not part of the format.
     SLIDES_TEMPLATE = r"""
 \input{{../../common/slides-head.tex}}
 \input{{../../common/"""+SLIDES_ENV_FILENAME+r"""}}
+\csname endofdump\endcsname
 \newcommand{{\lessonno}}{{{0:d}}}
 \newcommand{{\lessonnoo}}{{{0:02d}}}
 \input{{../../common/slides-conf.tex}}
 
 \input{{document.tex}}
+"""
+    PREAMBLE_FILENAME = "slides-preamble.tex"
+    PREAMBLE_FORMAT = "slides-preamble"
+    PREAMBLE_TEMPLATE = r"""\input{slides-head.tex}
+\input{"""+SLIDES_ENV_FILENAME+r"""}
+\csname endofdump\endcsname
+\begin{document}
+\end{document}
 """
 
     MAKEFILE_HEADER = """\
 LATEX=pdflatex -halt-on-error
+PYTHON=python3
+LATEX_FORMAT_FLAG=
 COMMON_DEPS=
-SLIDES_COMMON_DEPS=common/slides-*.tex
 SLIDES="""+SLIDES_FILENAME+"""
+LATEX_MAX_PASSES=5
+LATEX_AUX_FILES=$(addprefix $(basename $(SLIDES)).,aux nav toc snm out vrb)
+LATEX_RERUN=Rerun to get|Please rerun|Rerun LaTeX
+# run $(LATEX) until the auxiliary files stop changing and the log does not
+# ask for a rerun, at most $(LATEX_MAX_PASSES) times
+LATEX_CONVERGE=n=0; while :; do \
+	before=$$(cat $(LATEX_AUX_FILES) 2>/dev/null | cksum); \
+	$(LATEX) $(LATEX_FORMAT_FLAG) $(SLIDES) || exit 1; \
+	n=$$((n+1)); \
+	[ "$$(cat $(LATEX_AUX_FILES) 2>/dev/null | cksum)" != "$$before" ] || \
+		grep -Eq '$(LATEX_RERUN)' $(basename $(SLIDES)).log || break; \
+	[ $$n -lt $(LATEX_MAX_PASSES) ] || { echo "$(SLIDES) did not converge after $$n passes" >&2; break; }; \
+done; \
+echo "$@: $$n LaTeX passes"
+# $@ lists the checksums of its prerequisites and is only rewritten when they
+# changed, so whatever depends on it is rebuilt when the contents of its
+# inputs change, not when they are merely touched
+CONTENT_STAMP=cksum $(filter-out FORCE,$^) > $@.tmp && \
+	{ cmp -s $@.tmp $@ && rm -f $@.tmp || mv -f $@.tmp $@; }
 
 default: slides
+
+.PHONY: FORCE
+FORCE:
 """
 
+    # the scanned dependencies of slides.inputs are in slides.d, which is
+    # rewritten after every build of the lesson, like gcc -MD does it
     LESSON_SLIDES_TARGET = """\
-{rel_path}/slides.pdf: {rel_path}/${{SLIDES}} {rel_path}/"""+DOCUMENT_FILENAME+""" ${{SLIDES_COMMON_DEPS}} ${{COMMON_DEPS}}
-\tcd {rel_path}; $(LATEX) $(SLIDES) && $(LATEX) $(SLIDES)
+{rel_path}/slides.inputs: {rel_path}/"""+SLIDES_FILENAME+""" {rel_path}/"""+DOCUMENT_FILENAME+""" ${{COMMON_DEPS}} FORCE
+\t@$(CONTENT_STAMP)
+{rel_path}/slides.pdf: {rel_path}/slides.inputs {format_deps}
+\tcd {rel_path}; $(LATEX_CONVERGE)
+\t$(PYTHON) $(CONFIGURE) --write-deps {rel_path}
+-include {rel_path}/"""+DEPENDENCY_FILENAME+"""
+"""
+
+    DEPENDENCY_TEMPLATE = """\
+{rel_path}/slides.inputs: {deps}
+{targets}"""
+
+    # without mylatexformat, the format file is left empty and the slides
+    # are built without it; the flag is therefore decided when LaTeX runs
+    FORMAT_TARGET = """\
+LATEX_FORMAT_FLAG=$$(test -s ../../{fmt_path} && echo -fmt=../../common/"""+PREAMBLE_FORMAT+""")
+{stamp_path}: {deps} FORCE
+\t@$(CONTENT_STAMP)
+{fmt_path}: {stamp_path}
+\tcd common; $(LATEX) -interaction=nonstopmode -ini -jobname="""+PREAMBLE_FORMAT+""" "&pdflatex" mylatexformat.ltx """+PREAMBLE_FILENAME+""" </dev/null || \\
+\t\t{{ : > """+PREAMBLE_FORMAT+""".fmt; echo "could not build the preamble format (is mylatexformat installed?), building without it" >&2; }}
 """
 
     MAKEFILE_FOOTER = """\
 """
 
+    LATEX_COMMAND = ["pdflatex", "-interaction=nonstopmode", "-halt-on-error"]
+    LATEX_MAX_PASSES = 5
+    LATEX_AUX_EXTENSIONS = [".aux", ".nav", ".toc", ".snm", ".out", ".vrb"]
+    LATEX_RERUN_RE = re.compile(r"Rerun to get|Please rerun|Rerun LaTeX")
+    LATEX_OUTPUT_RE = re.compile(r"Output written on .*? \((\d+) pages?, (\d+) bytes\)")
+    FORMAT_COMMAND = ["pdflatex", "-ini", "-interaction=nonstopmode", "-halt-on-error",
+                      "-jobname=" + PREAMBLE_FORMAT, "&pdflatex", "mylatexformat.ltx"]
+
     REQUIRED_FILES = [DOCUMENT_FILENAME]
 
+    DIGEST_DB_FILENAME = "configure.digests"
+    DEPS_CACHE_FILENAME = "configure.deps"
+    HISTORY_FILENAME = "configure.history"
+    DEFAULT_CACHE_DIR = os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(os.path.join("~", ".cache")),
+        "slides"
+    )
+    DEFAULT_CACHE_SIZE = 1024 * 1024 * 1024
+
     def __init__(self, base_path,
             force_rebuild=False,
+            cache_dir=None,
+            cache_size=DEFAULT_CACHE_SIZE,
             **env_upd):
         super().__init__()
         self.base_path = base_path
-        try:
-            self.last_build = file_timestamp(
-                os.path.join(self.base_path, "Makefile")
-            )
-            last_script_change = file_timestamp(sys.argv[0])
-            self.last_build = max(self.last_build, last_script_change)
-        except OSError:
-            self.last_build = None
-        if force_rebuild:
-            self.last_build = force_rebuild
+        self.force_rebuild = force_rebuild
+        self.cache = None
+        if cache_dir:
+            self.cache = ArtifactCache(cache_dir, cache_size)
+        self.digests = DigestDB(os.path.join(self.base_path, self.DIGEST_DB_FILENAME))
+        self.scanner = DependencyScanner(self.base_path,
+            os.path.join(self.base_path, self.DEPS_CACHE_FILENAME))
+        self.history = BuildHistory(os.path.join(self.base_path, self.HISTORY_FILENAME))
         self.lessons = {}
+        self.engine_version = None
         self.env_file = os.path.join(self.base_path, "configure.env")
         self.env = {
             "author_name": r"\\authorname",
             "author_mail": r"\\authormail",
             "extra_line": r"",
-            "theme": r"Dresden"
+            "theme": r"Dresden",
+            "preamble_format": True,
         }
         if os.path.isfile(self.env_file):
             try:
@@ -86,8 +716,7 @@ default: slides
                 pass
         self.env.update(env_upd)
         try:
-            with open(self.env_file, "wb") as f:
-                pickle.dump(self.env, f)
+            write_if_changed(self.env_file, pickle.dumps(self.env))
         except (IOError, OSError) as err:
             logging.warn("could not save pickle'd state: %s", err)
         logging.debug("LaTeX substitution env: %r", self.env)
@@ -116,65 +745,505 @@ default: slides
                 raise Incomplete()
             self.lessons[lesson_no] = full_path
 
-    def create_slides_file(self, lesson_no, lesson_path):
-        slides_path = os.path.join(lesson_path, self.SLIDES_FILENAME)
+    def env_digest(self):
+        return data_digest(repr(sorted(self.env.items())).encode("utf-8"))
+
+    def write_generated(self, path, content):
+        """
+        Write the rendered *content* to the generated file *path* through
+        :func:`write_if_changed`, so that unchanged files keep their
+        timestamps and make does not rebuild anything. With force_rebuild,
+        the file is rewritten anyway. Return whether the file was written.
+        """
+        key = os.path.relpath(path, self.base_path)
+        data = content.encode("utf-8")
+        recorded = self.digests.get(key)
         try:
-            if file_timestamp(slides_path) >= self.last_build:
-                return
-        except TypeError:
-            # self.last_build is None
-            pass
-        except OSError:
-            pass
+            current = file_digest(path)
+        except (IOError, OSError):
+            current = None
+        if current is not None and recorded is not None and current != recorded:
+            logging.warn("`%s' has been modified since it was generated, overwriting it", key)
+        self.digests.set(key, data_digest(data))
+        written = write_if_changed(path, data, self.force_rebuild)
+        if written:
+            logging.debug("wrote %s", key)
+        return written
 
-        with open(slides_path, "w") as f:
-            f.write(self.SLIDES_TEMPLATE.format(
-                lesson_no,
-            ))
+    def create_slides_file(self, lesson_no, lesson_path):
+        slides_path = os.path.join(lesson_path, self.SLIDES_FILENAME)
+        self.write_generated(slides_path, self.SLIDES_TEMPLATE.format(
+            lesson_no,
+        ))
 
     def configure_lesson(self, lesson_no, path):
         logging.info("configuring lesson %d", lesson_no)
         self.create_slides_file(lesson_no, path)
 
-    def final_touch(self, path, timestamp):
-        fullpath = os.path.join(path, self.SLIDES_FILENAME)
-        os.utime(fullpath, (timestamp, timestamp))
-
-    def final_touches(self, timestamp):
-        for path in self.lessons.values():
-            self.final_touch(path, timestamp)
-
     def configure_lessons(self):
         slides_env_file = os.path.join(self.base_path, "common", self.SLIDES_ENV_FILENAME)
-        with open(slides_env_file, "w") as f:
-            f.write(self.SLIDES_ENV_TEMPLATE.format(**self.env))
+        self.write_generated(slides_env_file, self.SLIDES_ENV_TEMPLATE.format(**self.env))
+        self.write_generated(self.preamble_path(), self.PREAMBLE_TEMPLATE)
         for lesson_no, path in self.lessons.items():
             self.configure_lesson(lesson_no, path)
-        timestamp = self.create_makefile()
-        self.final_touches(int(timestamp))
+        self.create_makefile()
+        self.digests.save()
+        self.scanner.prune()
+        self.scanner.save()
+
+    def preamble_path(self):
+        return os.path.join(self.base_path, "common", self.PREAMBLE_FILENAME)
+
+    def format_path(self):
+        return os.path.join(self.base_path, "common", self.PREAMBLE_FORMAT + ".fmt")
+
+    def latex_version(self):
+        """
+        Return the first line of ``pdflatex --version``, or None if it cannot
+        be run. Formats and PDFs are only valid for the engine which built
+        them.
+        """
+        if self.engine_version is None:
+            try:
+                proc = subprocess.run(
+                    [self.LATEX_COMMAND[0], "--version"],
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                )
+            except OSError:
+                return None
+            lines = proc.stdout.decode("utf-8", errors="replace").splitlines()
+            self.engine_version = lines[0] if lines else ""
+        return self.engine_version
+
+    def format_digest(self):
+        """
+        Return a digest over everything the preamble format is built from:
+        the common files, the configure env and the engine version.
+        """
+        digest = hashlib.sha1()
+        digest.update(self.env_digest().encode("ascii"))
+        digest.update(str(self.latex_version()).encode("utf-8"))
+        for dependency, dependency_digest in sorted(
+                self.scanner.scan_with_digests(self.preamble_path()).items()):
+            digest.update("{}\0{}\0".format(
+                os.path.relpath(dependency, self.base_path),
+                dependency_digest
+            ).encode("utf-8"))
+        return digest.hexdigest()
+
+    def build_format(self):
+        """
+        Dump the shared preamble into a pdflatex format with mylatexformat,
+        unless the existing format has been built from the same inputs.
+        Return whether a usable format exists.
+        """
+        fmt_path = self.format_path()
+        key = os.path.relpath(fmt_path, self.base_path)
+        digest = self.format_digest()
+        if not self.force_rebuild and self.digests.get("build:" + key) == digest:
+            try:
+                if file_digest(fmt_path) == self.digests.get(key):
+                    return True
+            except (IOError, OSError):
+                pass
+        logging.info("building the preamble format")
+        proc = subprocess.run(
+            self.FORMAT_COMMAND + [self.PREAMBLE_FILENAME],
+            cwd=os.path.dirname(fmt_path),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        if proc.returncode != 0 or not os.path.isfile(fmt_path):
+            output = proc.stdout.decode("utf-8", errors="replace")
+            logging.warning("could not build the preamble format, building without it")
+            for line in latex_errors(output) or output.splitlines()[-10:]:
+                logging.warning("    %s", line)
+            self.digests.discard("build:" + key)
+            return False
+        self.digests.set("build:" + key, digest)
+        self.digests.set(key, file_digest(fmt_path))
+        return True
+
+    def run_latex(self, path, use_format=False):
+        """
+        Run one LaTeX pass on the slides file in *path*, loading the preamble
+        format if *use_format* is set. Return a tuple of the success flag and
+        the terminal output.
+        """
+        command = list(self.LATEX_COMMAND)
+        if use_format:
+            command.append("-fmt=" + os.path.splitext(
+                os.path.relpath(self.format_path(), path))[0])
+        proc = subprocess.run(
+            command + [self.SLIDES_FILENAME],
+            cwd=path,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        return proc.returncode == 0, proc.stdout.decode("utf-8", errors="replace")
+
+    def aux_digest(self, path):
+        """
+        Return a digest over the auxiliary files LaTeX wrote for the slides
+        in *path* (missing files count as empty).
+        """
+        base = os.path.splitext(self.SLIDES_FILENAME)[0]
+        digest = hashlib.sha1()
+        for ext in self.LATEX_AUX_EXTENSIONS:
+            try:
+                with open(os.path.join(path, base + ext), "rb") as f:
+                    digest.update(f.read())
+            except (IOError, OSError):
+                pass
+            digest.update(b"\0")
+        return digest.digest()
+
+    def rerun_requested(self, path):
+        log_file = os.path.join(path, os.path.splitext(self.SLIDES_FILENAME)[0] + ".log")
+        try:
+            with open(log_file, "r", errors="replace") as f:
+                return self.LATEX_RERUN_RE.search(f.read()) is not None
+        except (IOError, OSError):
+            return False
+
+    def build_lesson(self, lesson_no, path, use_format=False):
+        """
+        Build the slides of a single lesson. LaTeX is run again as long as
+        the auxiliary files change or the log asks for a rerun, but at most
+        LATEX_MAX_PASSES times. Return a tuple of the success flag, the
+        output of the last LaTeX pass and the list of the wall times of all
+        passes.
+        """
+        pass_times = []
+        for passes in range(1, self.LATEX_MAX_PASSES+1):
+            before = self.aux_digest(path)
+            start = time.monotonic()
+            ok, output = self.run_latex(path, use_format)
+            pass_times.append(time.monotonic() - start)
+            if not ok:
+                break
+            if self.aux_digest(path) == before and not self.rerun_requested(path):
+                break
+        else:
+            logging.warning("lesson %02d did not converge after %d passes",
+                            lesson_no, passes)
+        return ok, output, pass_times
+
+    def lesson_dependencies(self, path):
+        """
+        Return the files the slides of the lesson in *path* are built from.
+        """
+        return self.scanner.scan(os.path.join(path, self.SLIDES_FILENAME))
+
+    def write_dependency_file(self, path):
+        """
+        Write the files the slides of the lesson in *path* are built from
+        into its make dependency file. Every dependency also gets an empty
+        rule, so that make does not fail once it is removed.
+        """
+        rel_path = os.path.relpath(path, self.base_path)
+        deps = [
+            os.path.relpath(dependency, self.base_path)
+            for dependency in self.lesson_dependencies(path)
+        ]
+        try:
+            write_if_changed(os.path.join(path, self.DEPENDENCY_FILENAME),
+                self.DEPENDENCY_TEMPLATE.format(
+                    rel_path=rel_path,
+                    deps=" \\\n\t".join(deps),
+                    targets="".join("{0}:\n".format(dep) for dep in deps)
+                ).encode("utf-8"))
+        except (IOError, OSError) as err:
+            logging.warn("could not write the dependencies of `%s': %s", rel_path, err)
+
+    def lesson_digest(self, path):
+        """
+        Return a digest over everything the slides of the lesson in *path*
+        are built from: the files found by the dependency scan, the
+        configure env and, if the preamble format is used, the format digest
+        (which covers the engine version).
+        """
+        digest = hashlib.sha1()
+        digest.update(self.env_digest().encode("ascii"))
+        if self.env["preamble_format"]:
+            digest.update(self.format_digest().encode("ascii"))
+        for dependency, dependency_digest in sorted(self.scanner.scan_with_digests(
+                os.path.join(path, self.SLIDES_FILENAME)).items()):
+            digest.update("{}\0{}\0".format(
+                os.path.relpath(dependency, self.base_path),
+                dependency_digest
+            ).encode("utf-8"))
+        return digest.hexdigest()
+
+    def pdf_path(self, path):
+        return os.path.join(path, os.path.splitext(self.SLIDES_FILENAME)[0] + ".pdf")
+
+    def lesson_up_to_date(self, path, digest):
+        """
+        Return whether the slides of the lesson in *path* have been built
+        from inputs with *digest* and the PDF is still the one which was
+        built then.
+        """
+        if self.force_rebuild:
+            return False
+        rel_path = os.path.relpath(path, self.base_path)
+        if self.digests.get("build:" + rel_path) != digest:
+            return False
+        pdf_path = self.pdf_path(path)
+        try:
+            return file_digest(pdf_path) == self.digests.get(
+                os.path.relpath(pdf_path, self.base_path))
+        except (IOError, OSError):
+            return False
+
+    def cache_key(self, digest):
+        """
+        Return the key under which the build results of a lesson with the
+        input *digest* are cached, or None if the engine version is unknown.
+        The digest only uses paths relative to the base path, so that
+        other checkouts of the same lessons share the cached results.
+        """
+        version = self.latex_version()
+        if version is None:
+            return None
+        return data_digest("{}\0{}".format(digest, version).encode("utf-8"))
+
+    def build_outputs(self, path):
+        """
+        Return the output files of the last build of the lesson in *path*:
+        the PDF and the auxiliary files which exist.
+        """
+        base = os.path.join(path, os.path.splitext(self.SLIDES_FILENAME)[0])
+        return [self.pdf_path(path)] + [
+            base + ext for ext in self.LATEX_AUX_EXTENSIONS
+            if os.path.isfile(base + ext)
+        ]
+
+    def restore_build(self, path, digest):
+        """
+        Restore the build results of the lesson in *path* from the artifact
+        cache. Return whether they were found.
+        """
+        if self.cache is None or self.force_rebuild:
+            return False
+        key = self.cache_key(digest)
+        if key is None or not self.cache.restore(key, path):
+            return False
+        self.record_build(path, digest)
+        return True
+
+    def store_build(self, path, digest):
+        if self.cache is None:
+            return
+        key = self.cache_key(digest)
+        if key is not None:
+            self.cache.store(key, self.build_outputs(path))
+
+    def record_build(self, path, digest):
+        rel_path = os.path.relpath(path, self.base_path)
+        pdf_path = self.pdf_path(path)
+        self.digests.set("build:" + rel_path, digest)
+        self.digests.set(os.path.relpath(pdf_path, self.base_path), file_digest(pdf_path))
+
+    def record_timing(self, path, output, pass_times, duration, use_format):
+        """
+        Add the timing of a successful build of the lesson in *path* to the
+        build history. The page count is taken from the LaTeX output.
+        """
+        match = self.LATEX_OUTPUT_RE.search(output)
+        try:
+            size = os.path.getsize(self.pdf_path(path))
+        except OSError:
+            size = None
+        self.history.add(os.path.relpath(path, self.base_path), {
+            "time": time.time(),
+            "passes": pass_times,
+            "total": duration,
+            "pages": int(match.group(1)) if match else None,
+            "size": size,
+            "format": use_format,
+            "engine": self.latex_version(),
+        })
+
+    def build_lessons(self, jobs=None, keep_going=False, only=None):
+        """
+        Build the slides of all discovered lessons (or only of the lesson
+        numbers in *only*) whose inputs changed since their last successful
+        build with up to *jobs* (default: number of CPUs) LaTeX processes at
+        a time. Unless *keep_going* is set,
+        no further lessons are started once a lesson has failed; lessons
+        which are already being built are finished, like make does. Raise
+        :class:`BuildFailed` if any lesson failed.
+        """
+        jobs = jobs or os.cpu_count() or 1
+        stop = threading.Event()
+        failed = []
+        skipped = 0
+        lessons = []
+        for lesson_no, path in sorted(self.lessons.items()):
+            if only is not None and lesson_no not in only:
+                continue
+            digest = self.lesson_digest(path)
+            if self.lesson_up_to_date(path, digest):
+                logging.info("lesson %02d is up to date", lesson_no)
+            elif self.restore_build(path, digest):
+                print("lesson {:02d} restored from the cache".format(lesson_no), flush=True)
+            else:
+                lessons.append((lesson_no, path, digest))
+        use_format = bool(lessons) and self.env["preamble_format"] and self.build_format()
+        logging.info("building %d lessons with %d jobs", len(lessons), jobs)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = dict(
+                (executor.submit(self.timed_build_lesson, lesson_no, path, use_format, stop),
+                 (lesson_no, path, digest))
+                for lesson_no, path, digest in lessons
+            )
+            done = 0
+            for future in concurrent.futures.as_completed(futures):
+                lesson_no, path, digest = futures[future]
+                if future.cancelled():
+                    skipped += 1
+                    continue
+                ok, output, pass_times, duration = future.result()
+                if ok is None:
+                    # picked up by a worker after the build was stopped
+                    skipped += 1
+                    continue
+                done += 1
+                progress = "[{}/{}]".format(done, len(lessons))
+                if ok:
+                    self.record_build(path, digest)
+                    self.store_build(path, digest)
+                    self.write_dependency_file(path)
+                    self.record_timing(path, output, pass_times, duration, use_format)
+                    print("{} lesson {:02d} built in {:.1f}s ({} passes)".format(
+                        progress, lesson_no, duration, len(pass_times)), flush=True)
+                else:
+                    self.digests.discard("build:" + os.path.relpath(path, self.base_path))
+                    failed.append(lesson_no)
+                    logging.error("%s lesson %02d failed after %.1fs",
+                                  progress, lesson_no, duration)
+                    for line in latex_errors(output) or output.splitlines()[-10:]:
+                        logging.error("    %s", line)
+                    if not keep_going:
+                        stop.set()
+                        for pending in futures:
+                            pending.cancel()
+        self.digests.save()
+        self.scanner.save()
+        self.history.save()
+        if failed:
+            if skipped:
+                logging.warning("%d lessons were not built", skipped)
+            raise BuildFailed(sorted(failed))
+
+    def timed_build_lesson(self, lesson_no, path, use_format, stop):
+        if stop.is_set():
+            return None, "", [], 0.0
+        logging.info("building lesson %02d", lesson_no)
+        start = time.monotonic()
+        ok, output, pass_times = self.build_lesson(lesson_no, path, use_format)
+        return ok, output, pass_times, time.monotonic() - start
+
+    def watched_files(self):
+        """
+        Return a dict mapping every file a lesson is built from to the set
+        of lesson numbers which depend on it.
+        """
+        files = {}
+        for lesson_no, path in self.lessons.items():
+            for dependency in [os.path.join(path, self.DOCUMENT_FILENAME)] + \
+                    self.lesson_dependencies(path):
+                files.setdefault(dependency, set()).add(lesson_no)
+        return files
+
+    def rebuild(self, jobs, only=None):
+        try:
+            self.build_lessons(jobs=jobs, keep_going=True, only=only)
+        except BuildFailed as err:
+            print("Build failed: {}".format(err), flush=True)
+
+    def watch(self, jobs=None, poll=False, interval=0.5, debounce=0.3):
+        """
+        Build all lessons, then wait for changes to the files they are built
+        from and rebuild the lessons which depend on a changed file, with up
+        to *jobs* LaTeX processes at a time. Changes are collected until
+        nothing has changed for *debounce* seconds, so that a burst of saves
+        triggers a single build. Lessons which are added to or removed from
+        the lesson directory are picked up as well. Runs until interrupted.
+        """
+        lesson_dir = os.path.join(self.base_path, self.LESSON_DIR)
+        watcher = create_watcher(poll, interval)
+        try:
+            self.rebuild(jobs)
+            while True:
+                files = self.watched_files()
+                watcher.watch(files, [lesson_dir])
+                print("Watching {} files of {} lessons for changes.".format(
+                    len(files), len(self.lessons)), flush=True)
+                changed = watcher.wait()
+                while True:
+                    more = watcher.wait(debounce)
+                    if not more:
+                        break
+                    changed |= more
+                for path in sorted(changed):
+                    logging.info("changed: %s", os.path.relpath(path, self.base_path))
+                affected = set()
+                for path in changed:
+                    affected |= files.get(path, set())
+                if lesson_dir in changed:
+                    known = set(self.lessons)
+                    self.lessons = {}
+                    try:
+                        self.autodiscover_lessons()
+                        self.configure_lessons()
+                    except Incomplete:
+                        print("Configure incomplete, waiting for changes.", flush=True)
+                        continue
+                    affected |= set(self.lessons) - known
+                affected &= set(self.lessons)
+                if affected:
+                    self.rebuild(jobs, only=affected)
+        finally:
+            watcher.close()
 
     def create_makefile(self):
         logging.info("writing Makefile")
         makefile = os.path.join(self.base_path, "Makefile")
-        with open(makefile, "w") as f:
-            f.write(self.MAKEFILE_HEADER)
-
-            for lesson_no, path in self.lessons.items():
-                rel_path = os.path.relpath(path, self.base_path)
-                f.write(self.LESSON_SLIDES_TARGET.format(
-                    lesson_no=lesson_no,
-                    full_path=path,
-                    rel_path=rel_path
-                ))
-
-            f.write("slides: {0}\n".format(
-                " ".join("{0}/slides.pdf".format(os.path.relpath(path, self.base_path)) for path in self.lessons.values())
+        # the lesson rules run this very configure.py, which need not be in
+        # the base path
+        parts = ["CONFIGURE={0}\n".format(os.path.abspath(__file__)), self.MAKEFILE_HEADER]
+        format_deps = []
+        if self.env["preamble_format"]:
+            fmt_path = os.path.relpath(self.format_path(), self.base_path)
+            format_deps.append(fmt_path)
+            parts.append(self.FORMAT_TARGET.format(
+                fmt_path=fmt_path,
+                stamp_path=os.path.splitext(fmt_path)[0] + ".inputs",
+                deps=" \\\n\t".join(
+                    os.path.relpath(dependency, self.base_path)
+                    for dependency in self.scanner.scan(self.preamble_path())
+                )
             ))
-
-            f.write(self.MAKEFILE_FOOTER)
-        timestamp = int(file_timestamp(makefile))
-        os.utime(makefile, (timestamp, timestamp))
-        return timestamp
+        for lesson_no, path in self.lessons.items():
+            rel_path = os.path.relpath(path, self.base_path)
+            self.write_dependency_file(path)
+            parts.append(self.LESSON_SLIDES_TARGET.format(
+                lesson_no=lesson_no,
+                full_path=path,
+                rel_path=rel_path,
+                format_deps=" ".join(format_deps)
+            ))
+        parts.append("slides: {0}\n".format(
+            " ".join("{0}/slides.pdf".format(os.path.relpath(path, self.base_path)) for path in self.lessons.values())
+        ))
+        parts.append(self.MAKEFILE_FOOTER)
+        self.write_generated(makefile, "".join(parts))
 
 
 if __name__ == "__main__":
@@ -218,6 +1287,109 @@ configure.py, as the state is saved to configure.env."""
         dest="theme",
         help="Beamer theme to use."
     )
+    parser.add_argument(
+        "--no-preamble-format",
+        dest="preamble_format",
+        action="store_false",
+        default=None,
+        help="Do not precompile the common preamble into a format file \
+(requires mylatexformat); every lesson processes it from scratch instead."
+    )
+    parser.add_argument(
+        "--preamble-format",
+        dest="preamble_format",
+        action="store_true",
+        default=None,
+        help="Precompile the common preamble into a format file which all \
+lessons load (default)."
+    )
+    parser.add_argument(
+        "-b", "--build",
+        dest="build",
+        action="store_true",
+        default=False,
+        help="Build the slides of all lessons after configuring, without \
+make. Runs several LaTeX processes in parallel (see -j)."
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        dest="jobs",
+        type=int,
+        default=None,
+        help="Number of lessons to build at the same time with --build. \
+Defaults to the number of CPUs."
+    )
+    parser.add_argument(
+        "-k", "--keep-going",
+        dest="keep_going",
+        action="store_true",
+        default=False,
+        help="With --build, continue building the other lessons after a \
+lesson has failed."
+    )
+    parser.add_argument(
+        "-w", "--watch",
+        dest="watch",
+        action="store_true",
+        default=False,
+        help="Build the slides like --build, then keep watching the lessons \
+and the common files and rebuild the lessons affected by each change. Stop \
+with Ctrl-C."
+    )
+    parser.add_argument(
+        "--poll",
+        dest="poll",
+        type=float,
+        nargs="?",
+        const=0.5,
+        default=None,
+        metavar="SECONDS",
+        help="With --watch, check for changes every SECONDS (default: 0.5) \
+instead of using inotify."
+    )
+    parser.add_argument(
+        "--cache-dir",
+        dest="cache_dir",
+        default=Configure.DEFAULT_CACHE_DIR,
+        help="Directory in which --build and --watch keep the built slides, \
+keyed by the contents of all their inputs, so that other checkouts can reuse \
+them. Defaults to {}.".format(Configure.DEFAULT_CACHE_DIR)
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="cache_dir",
+        action="store_const",
+        const="",
+        help="Do not use the build cache."
+    )
+    parser.add_argument(
+        "--cache-size",
+        dest="cache_size",
+        type=lambda value: int(float(value) * 1024 * 1024),
+        default=None,
+        metavar="MB",
+        help="Evict the least recently used slides from the build cache once \
+it is larger than MB megabytes (default: {}).".format(
+            Configure.DEFAULT_CACHE_SIZE // (1024 * 1024))
+    )
+    parser.add_argument(
+        "--report",
+        dest="report",
+        action="store_true",
+        default=False,
+        help="Print the slowest lessons and the lessons which got slower to \
+build, from the timings recorded by --build and --watch in configure.history, \
+and exit."
+    )
+    parser.add_argument(
+        "--write-deps",
+        dest="write_deps",
+        nargs="+",
+        default=None,
+        metavar="LESSON",
+        help="Only rewrite the make dependency files of the given lesson \
+directories and exit. The Makefile runs this after building a lesson."
+    )
     parser.add_argument(
         "-v",
         dest="verbosity",
@@ -229,6 +1401,16 @@ configure.py, as the state is saved to configure.env."""
 
     args = parser.parse_args()
 
+    build = args.build
+    jobs = args.jobs
+    keep_going = args.keep_going
+    watch = args.watch
+    poll = args.poll
+    report = args.report
+    write_deps = args.write_deps
+    del args.build, args.jobs, args.keep_going, args.watch, args.poll, args.report
+    del args.write_deps
+
     verbosity = len(args.verbosity)
     args.verbosity = None
 
@@ -243,10 +1425,22 @@ configure.py, as the state is saved to configure.env."""
     logging.basicConfig(level=level[verbosity],
                         format='%(levelname)-8s %(message)s')
 
+    if report:
+        # only reads the history, without touching configure.env
+        BuildHistory(os.path.join(os.getcwd(), Configure.HISTORY_FILENAME)).print_report()
+        sys.exit(0)
+
     configure = Configure(
         os.getcwd(),
         **dict((k, v) for k, v in args._get_kwargs() if v is not None)
     )
+
+    if write_deps:
+        for path in write_deps:
+            configure.write_dependency_file(os.path.abspath(path))
+        configure.scanner.save()
+        sys.exit(0)
+
     try:
         configure.autodiscover_lessons()
         configure.configure_lessons()
@@ -254,3 +1448,21 @@ configure.py, as the state is saved to configure.env."""
         print("Configure incomplete.")
         sys.exit(1)
 
+    if watch:
+        try:
+            configure.watch(jobs=jobs, poll=poll is not None,
+                            interval=poll or 0.5)
+        except KeyboardInterrupt:
+            print("Watch stopped.")
+        sys.exit(0)
+
+    if build:
+        try:
+            configure.build_lessons(jobs=jobs, keep_going=keep_going)
+        except BuildFailed as err:
+            print("Build failed: {}".format(err))
+            sys.exit(1)
+        except KeyboardInterrupt:
+            print("Build interrupted.")
+            sys.exit(130)
+
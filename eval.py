@@ -1,9 +1,14 @@
 #!/usr/bin/python3
 # encoding=utf-8
-import subprocess
 import re
 import sys
-import argparse
+import os
+import array
+import itertools
+import importlib
+
+# everything else (subprocess, argparse, numpy, ...) is imported where it is
+# needed, so that importing this module as a library stays cheap.
 
 class bcolors:
     HEADER = '\033[95m'
@@ -36,23 +41,111 @@ MIN_POINTS = MAX_POINTS * 0.6
 # one more than usual because two submissions have been combined into one
 MAX_MISSING_SUBMISSIONS = 3
 
+# bump whenever the contents of the cache file change their meaning
+CACHE_VERSION = 3
+
 """
 contains commits which are to be ignored and should not produce any
 warning output.
 """
 commitWhitelist = [
 ]
-looseMatch = re.compile("[0-9a-f]{40} (Amm?ended correction|corrected|imported).*", re.I)
-ignore = re.compile("[0-9a-f]{40} (Merge|((Amm?ended )?[Ss]ubmission|\[ignore\])).*", re.I)
-extractCommitId = re.compile("^[0-9a-f]{40}", re.I)
-corrected = re.compile("([0-9a-fA-F]{40}) (Amm?ended correction( of)?|corrected|imported):? (([0-9]{1,2})/(\w+)|(\w+)/([0-9]{1,2}))\W?\s*(([0-9.]+)\s*\+\s*([0-9.]+)\s*=)?\s*([0-9.]+)?(\s+pts)?(!)?", re.I)
+correctionKeyword = "(Amm?ended correction( of)?|corrected|imported)"
+correctionTail = r":? (([0-9]{1,2})/(\w+)|(\w+)/([0-9]{1,2}))\W?\s*(([0-9.]+)\s*\+\s*([0-9.]+)\s*=)?\s*([0-9.]+)?(\s+pts)?(!)?"
+# prefilter for git log --grep, must accept every line which lineClassifier
+# treats as a correction
+gitCorrectionGrep = "^(amm?ended correction|corrected|imported)"
+
+_lineClassifier = None
+
+def lineClassifier():
+    """
+    returns the pattern which classifies a whole log line in one match,
+    compiling it on first use. groups 1 to 14 are laid out like the groups of
+    the former corrected pattern (commit id, keyword, unit/name, points,
+    flags); the named groups only take part if the line is no well-formed
+    correction.
+    """
+    global _lineClassifier
+    if _lineClassifier is None:
+        _lineClassifier = re.compile(
+            "([0-9a-f]{40})(?: (?:" + correctionKeyword + correctionTail +
+            "|(?P<malformed>Amm?ended correction|corrected|imported)" +
+            r"|(?P<ignored>Merge|(Amm?ended )?[Ss]ubmission|\[ignore\])))?",
+            re.I)
+    return _lineClassifier
+
+_lazyModules = {}
+
+def lazyImport(name):
+    """
+    imports the module called name on first use and returns it, or None if
+    it is not installed. used for the heavy optional modules (numpy, the HTTP
+    server).
+    """
+    if name not in _lazyModules:
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            module = None
+        _lazyModules[name] = module
+    return _lazyModules[name]
+
+LINE_IGNORED = 0
+LINE_WHITELISTED = 1
+LINE_CORRECTION = 2
+LINE_UNRECOGNIZED = 3
+LINE_MALFORMED = 4
+
+def classifyLine(line):
+    """
+    returns a tuple (kind, commitId, correction), where kind is one of the
+    LINE_* constants and correction is a tuple (unit, person, points, style,
+    forced) for LINE_CORRECTION and None otherwise.
+    """
+    match = lineClassifier().match(line)
+    if match is None:
+        if len(line.strip()) == 0:
+            return (LINE_IGNORED, None, None)
+        return (LINE_UNRECOGNIZED, None, None)
+    commitId = match.group(1)
+    if match.group(2) is None:
+        if match.group("malformed") is not None:
+            return (LINE_MALFORMED, commitId, None)
+        if match.group("ignored") is not None:
+            return (LINE_IGNORED, commitId, None)
+        if commitId in commitWhitelist:
+            return (LINE_WHITELISTED, commitId, None)
+        return (LINE_UNRECOGNIZED, commitId, None)
+    if commitId in commitWhitelist:
+        return (LINE_WHITELISTED, commitId, None)
+
+    groups = match.groups()[:14]
+    unit = None
+    person = None
+    if groups[4] is None:
+        unit = int(groups[7])
+        person = groups[6]
+    else:
+        unit = int(groups[4])
+        person = groups[5]
+    points = None
+    style = 0
+    if unit >= MIN_UNIT:
+        if groups[-2] is None:
+            points = float(groups[-4]) + float(groups[-3])
+            style = float(groups[-3])
+        else:
+            points = float(groups[-2])
+    return (LINE_CORRECTION, commitId, (unit, person, points, style, groups[-1] == "!"))
 
 class Acknowledgement(object):
-    def __init__(self, unit, person, points, style):
+    def __init__(self, unit, person, points, style, commitId=None):
         self.unit = unit
         self.person = person
         self.points = points
         self.style = style
+        self.commitId = commitId
 
     def __str__(self):
         return "{0}/{1}: {2} pts".format(self.unit, self.person, self.points)
@@ -70,6 +163,15 @@ class PersonData(object):
             self.style += ack.style
             self.submissions.append((ack.unit, ack.points))
 
+    def remove(self, ack):
+        """
+        takes back an acknowledgement which has been added before.
+        """
+        if ack.points is not None:
+            self.pointSum -= ack.points
+            self.style -= ack.style
+            self.submissions.remove((ack.unit, ack.points))
+
     def passed(self):
         return self.pointSum >= MIN_POINTS and len(self.submissions) >= MIN_SUBMISSIONS
 
@@ -85,19 +187,392 @@ class PersonData(object):
             avgPts = sum((submission[1] for submission in self.submissions))/len(self.submissions)
         return (avgPts, (MIN_POINTS-self.pointSum) <= remainingUnits * avgPts)
 
+class CohortPersonData(PersonData):
+    """
+    read-only PersonData view onto one row of a Cohort.
+    """
+    def __init__(self, cohort, row):
+        self.cohort = cohort
+        self.row = row
+
+    @property
+    def person(self):
+        return self.cohort.names[self.row]
+
+    @property
+    def pointSum(self):
+        return self.cohort.pointSum[self.row]
+
+    @property
+    def style(self):
+        return self.cohort.style[self.row]
+
+    @property
+    def submissions(self):
+        return self.cohort.submissionsOf(self.row)
+
+    def add(self, ack):
+        raise TypeError("cohort rows are read-only")
+
+    def remove(self, ack):
+        raise TypeError("cohort rows are read-only")
+
+class Cohort(object):
+    """
+    columnar storage for the data of all persons, sorted by name. iterating
+    over a cohort yields PersonData views, evaluate() computes the
+    statistics for all persons at once, vectorized if numpy is available.
+    """
+    def __init__(self, acknowledgements):
+        rows = {}
+        names = []
+        pointSum = array.array("d")
+        submissionCount = array.array("q")
+        style = array.array("d")
+        scoreRows = array.array("q")
+        scoreUnits = array.array("q")
+        scorePoints = array.array("d")
+        self.maxUnit = 0
+        self.maxNameLen = 0
+        for ack in acknowledgements:
+            row = rows.get(ack.person)
+            if row is None:
+                row = rows[ack.person] = len(names)
+                names.append(ack.person)
+                pointSum.append(0.)
+                submissionCount.append(0)
+                style.append(0.)
+            if (ack.unit > self.maxUnit):
+                self.maxUnit = ack.unit
+            if (len(ack.person) > self.maxNameLen):
+                self.maxNameLen = len(ack.person)
+            if ack.points is not None:
+                pointSum[row] += ack.points
+                style[row] += ack.style
+                submissionCount[row] += 1
+                scoreRows.append(row)
+                scoreUnits.append(ack.unit)
+                scorePoints.append(ack.points)
+
+        order = sorted(range(len(names)), key=names.__getitem__)
+        newRow = [0] * len(order)
+        for i, row in enumerate(order):
+            newRow[row] = i
+        # the scores are grouped by row, keeping the order of the
+        # acknowledgements within each row
+        scoreOrder = sorted(range(len(scoreRows)), key=lambda i: newRow[scoreRows[i]])
+        self.setRows(
+            [names[row] for row in order],
+            (pointSum[row] for row in order),
+            (submissionCount[row] for row in order),
+            (style[row] for row in order),
+            (scoreUnits[i] for i in scoreOrder),
+            (scorePoints[i] for i in scoreOrder))
+
+    def setRows(self, names, pointSum, submissionCount, style, scoreUnits, scorePoints):
+        """
+        sets the columns, one entry per person sorted by name. the scores
+        are grouped by row; scoreOffsets[row] is where the scores of row
+        start.
+        """
+        self.names = list(names)
+        self.pointSum = array.array("d", pointSum)
+        self.submissionCount = array.array("q", submissionCount)
+        self.style = array.array("d", style)
+        self.scoreUnits = array.array("q", scoreUnits)
+        self.scorePoints = array.array("d", scorePoints)
+        self.scoreOffsets = array.array("q", [0])
+        for count in self.submissionCount:
+            self.scoreOffsets.append(self.scoreOffsets[-1] + count)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        for row in range(len(self.names)):
+            yield CohortPersonData(self, row)
+
+    def submissionsOf(self, row):
+        start, end = self.scoreOffsets[row], self.scoreOffsets[row+1]
+        return list(zip(self.scoreUnits[start:end], self.scorePoints[start:end]))
+
+    def unitScores(self):
+        """
+        returns the points per person and unit as matrix with one row per
+        person and one column per unit up to maxUnit, NaN where nothing was
+        acknowledged.
+        """
+        numpy = lazyImport("numpy")
+        if numpy is None:
+            matrix = [[float("nan")] * (self.maxUnit + 1) for name in self.names]
+            for row in range(len(self.names)):
+                for unit, points in self.submissionsOf(row):
+                    matrix[row][unit] = points
+            return matrix
+        matrix = numpy.full((len(self.names), self.maxUnit + 1), numpy.nan)
+        rows = numpy.repeat(numpy.arange(len(self.names)),
+            numpy.frombuffer(self.submissionCount, dtype=numpy.int64))
+        matrix[rows, numpy.frombuffer(self.scoreUnits, dtype=numpy.int64)] = \
+            numpy.frombuffer(self.scorePoints, dtype=numpy.float64)
+        return matrix
+
+    def evaluate(self, currentUnit):
+        numpy = lazyImport("numpy")
+        if numpy is None or len(self.names) == 0:
+            return evaluatePersons(self, currentUnit)
+
+        remainingUnits = MAX_UNIT - currentUnit
+        count = len(self.names)
+        pts = numpy.frombuffer(self.pointSum, dtype=numpy.float64)
+        subs = numpy.frombuffer(self.submissionCount, dtype=numpy.int64)
+        style = numpy.frombuffer(self.style, dtype=numpy.float64)
+
+        passed = (pts >= MIN_POINTS) & (subs >= MIN_SUBMISSIONS)
+        canPassBySubmissions = (MIN_SUBMISSIONS - (subs + remainingUnits)) <= 0
+        canPassByPoints = ((pts - MIN_POINTS) + remainingUnits * MAX_POINTS_PER_SUBMISSION) >= 0
+        avgPts = numpy.zeros(count)
+        numpy.divide(pts, subs, out=avgPts, where=subs > 0)
+        mayPassByPoints = (MIN_POINTS - pts) <= remainingUnits * avgPts
+        missingPts = numpy.maximum(0., MIN_POINTS - pts)
+        missingSubs = numpy.maximum(0, MIN_SUBMISSIONS - subs)
+        if remainingUnits > 0:
+            neededAvg = missingPts / remainingUnits
+        else:
+            neededAvg = numpy.full(count, numpy.nan)
+
+        # cumsum adds up sequentially, so the totals are bit-identical to the
+        # ones of evaluatePersons
+        totalMissingSubs = int(missingSubs[canPassBySubmissions].sum())
+        if (canPassBySubmissions & (missingSubs == 0)).any():
+            # evaluatePersons accumulates max(0., ...), which is a float for
+            # persons without missing submissions
+            totalMissingSubs = float(totalMissingSubs)
+        totals = (
+            float(pts.cumsum()[-1]),
+            int(subs.sum()),
+            float(avgPts.cumsum()[-1]) / count,
+            float(numpy.where(canPassByPoints, missingPts, 0.).cumsum()[-1]),
+            totalMissingSubs,
+            float(neededAvg.cumsum()[-1]) / count,
+            float(style.cumsum()[-1]),
+        )
+        columns = (
+            self.names,
+            pts.tolist(),
+            subs.tolist(),
+            style.tolist(),
+            passed.tolist(),
+            canPassBySubmissions.tolist(),
+            canPassByPoints.tolist(),
+            avgPts.tolist(),
+            mayPassByPoints.tolist(),
+            missingPts.tolist(),
+            missingSubs.tolist(),
+            neededAvg.tolist(),
+        )
+        return CohortState(currentUnit, columns, totals)
+
+class CohortState(object):
+    """
+    the statistics printData shows for a given unit, as one list per
+    quantity with an entry per person, plus the totals.
+    """
+    COLUMNS = (
+        "person",
+        "pointSum",
+        "submissionCount",
+        "style",
+        "passed",
+        "canPassBySubmissions",
+        "canPassByPoints",
+        "avgPts",
+        "mayPassByPoints",
+        "missingPts",
+        "missingSubs",
+        "neededAvg",
+    )
+    TOTALS = (
+        "totalPts",
+        "totalSubsCount",
+        "totalAvg",
+        "totalMissingPts",
+        "totalMissingSubs",
+        "totalNeededAvg",
+        "totalStyle",
+    )
+
+    def __init__(self, currentUnit, columns, totals):
+        self.currentUnit = currentUnit
+        self.remainingUnits = MAX_UNIT - currentUnit
+        for name, column in zip(self.COLUMNS, columns):
+            setattr(self, name, column)
+        for name, total in zip(self.TOTALS, totals):
+            setattr(self, name, total)
+
+    def __len__(self):
+        return len(self.person)
+
+class UnitIndex(object):
+    """
+    the acknowledgements indexed by unit and by person, together with the
+    cumulative points, submissions and style points of every person after
+    every unit. a snapshot of any past unit is then only a lookup.
+    """
+    def __init__(self, acknowledgements):
+        self.byUnit = {}
+        self.byPerson = {}
+        for ack in acknowledgements:
+            if ack.points is not None:
+                self.byUnit.setdefault(ack.unit, []).append(ack)
+                self.byPerson.setdefault(ack.person, []).append(ack)
+        self.names = sorted(self.byPerson)
+        self.maxUnit = max(self.byUnit) if self.byUnit else 0
+        rows = dict((name, row) for row, name in enumerate(self.names))
+
+        # scores[row] are the (unit, points) of a person ordered by unit, so
+        # the submissions up to a unit are a prefix of them
+        self.scores = [
+            sorted((ack.unit, ack.points) for ack in self.byPerson[name])
+            for name in self.names
+        ]
+        # pointSum[unit][row] etc. are the totals after unit
+        pointSum = array.array("d", [0.]) * len(self.names)
+        submissionCount = array.array("q", [0]) * len(self.names)
+        style = array.array("d", [0.]) * len(self.names)
+        self.pointSum = []
+        self.submissionCount = []
+        self.style = []
+        for unit in range(self.maxUnit + 1):
+            pointSum = array.array("d", pointSum)
+            submissionCount = array.array("q", submissionCount)
+            style = array.array("d", style)
+            for ack in self.byUnit.get(unit, ()):
+                row = rows[ack.person]
+                pointSum[row] += ack.points
+                submissionCount[row] += 1
+                style[row] += ack.style
+            self.pointSum.append(pointSum)
+            self.submissionCount.append(submissionCount)
+            self.style.append(style)
+
+    def units(self):
+        """
+        the units for which something has been acknowledged, in order.
+        """
+        return sorted(self.byUnit)
+
+    def snapshot(self, unit):
+        """
+        returns the cohort as it was after unit, i.e. as if only the
+        corrections up to unit had been committed.
+        """
+        if unit < 0:
+            raise ValueError("unit must not be negative, got {0}".format(unit))
+        return CohortSnapshot(self, unit)
+
+class CohortSnapshot(Cohort):
+    """
+    Cohort view of a UnitIndex after a given unit. only the persons with at
+    least one submission up to that unit are part of it.
+    """
+    def __init__(self, index, unit):
+        Cohort.__init__(self, ())
+        # a unit after the last acknowledged one looks like the last one
+        column = min(unit, index.maxUnit)
+        pointSum = index.pointSum[column]
+        submissionCount = index.submissionCount[column]
+        style = index.style[column]
+        rows = [row for row in range(len(index.names)) if submissionCount[row] > 0]
+        # index.scores are ordered by unit, so the scores up to unit are a
+        # prefix of them
+        scores = [index.scores[row][:submissionCount[row]] for row in rows]
+        self.setRows(
+            (index.names[row] for row in rows),
+            (pointSum[row] for row in rows),
+            (submissionCount[row] for row in rows),
+            (style[row] for row in rows),
+            (unit for rowScores in scores for unit, points in rowScores),
+            (points for rowScores in scores for unit, points in rowScores))
+        self.maxUnit = unit
+        self.maxNameLen = max((len(name) for name in self.names), default=0)
+
+def evaluatePersons(personData, currentUnit):
+    """
+    computes a CohortState person by person, using the PersonData methods.
+    """
+    remainingUnits = (MAX_UNIT - currentUnit)
+    columns = tuple([] for name in CohortState.COLUMNS)
+    (names, ptsColumn, subsColumn, styleColumn, passedColumn,
+     canPassBySubmissionsColumn, canPassByPointsColumn, avgPtsColumn,
+     mayPassByPointsColumn, missingPtsColumn, missingSubsColumn,
+     neededAvgColumn) = columns
+
+    totalPts = 0.
+    totalAvg = 0.
+    totalSubsCount = 0
+    totalMissingPts = 0.
+    totalMissingSubs = 0
+    totalNeededAvg = 0.
+    totalStyle = 0.
+
+    for person in personData:
+        pts = person.pointSum
+        subs = len(person.submissions)
+        canPassBySubmissions, canPassByPoints = person.canPass(currentUnit)
+        avgPts, mayPassByPoints = person.mayPass(currentUnit)
+        missingPts = max(0., MIN_POINTS - pts)
+        missingSubs = max(0, MIN_SUBMISSIONS - subs)
+        neededAvg = missingPts / remainingUnits if remainingUnits > 0 else float("NaN")
+
+        names.append(person.person)
+        ptsColumn.append(pts)
+        subsColumn.append(subs)
+        styleColumn.append(person.style)
+        passedColumn.append(person.passed())
+        canPassBySubmissionsColumn.append(canPassBySubmissions)
+        canPassByPointsColumn.append(canPassByPoints)
+        avgPtsColumn.append(avgPts)
+        mayPassByPointsColumn.append(mayPassByPoints)
+        missingPtsColumn.append(missingPts)
+        missingSubsColumn.append(missingSubs)
+        neededAvgColumn.append(neededAvg)
+
+        totalPts += pts
+        totalSubsCount += subs
+        totalAvg += avgPts
+        if canPassByPoints:
+            totalMissingPts += max(0., MIN_POINTS - pts)
+        if canPassBySubmissions:
+            totalMissingSubs += max(0., MIN_SUBMISSIONS - subs)
+        totalNeededAvg += neededAvg
+        totalStyle += person.style
+
+    if len(names) > 0:
+        totalAvg /= len(names)
+        totalNeededAvg /= len(names)
+    totals = (totalPts, totalSubsCount, totalAvg, totalMissingPts,
+              totalMissingSubs, totalNeededAvg, totalStyle)
+    return CohortState(currentUnit, columns, totals)
+
 class ColoredString(object):
     def __init__(self, value, color):
         self.value = value
         self.color = color
 
 class DataColumn(object):
-    def __init__(self, heading, index, align = None, dataType = None, fill = None, precision = None):
+    """
+    width is the width the values of the column usually fit in, used
+    instead of measuring them when a table is streamed.
+    """
+    def __init__(self, heading, index, align = None, dataType = None, fill = None, precision = None, width = None):
         self.heading = heading
         self.index = index
         self.align = align
         self.dataType = dataType
         self.fill = fill
         self.precision = precision
+        self.width = width
+        self._formatters = {}
 
     def _buildFmtStr(self, width = None):
         fmt = "{"+str(self.index)
@@ -115,17 +590,32 @@ class DataColumn(object):
                 fmt += self.dataType
         return fmt+"}"
 
+    def _formatter(self, width = None):
+        """
+        returns the bound format method of the format string for width,
+        built only once per width.
+        """
+        try:
+            return self._formatters[width]
+        except KeyError:
+            formatter = self._buildFmtStr(width).format
+            self._formatters[width] = formatter
+            return formatter
+
     def formatHLine(self, width):
         return "─"*width
 
     def getWidth(self, data):
-        return max(len(self.heading), len(self._buildFmtStr().format(*data)))
+        return max(len(self.heading), len(self._formatter()(*data)))
+
+    def fixedWidth(self):
+        return max(len(self.heading), self.width or 0)
 
     def formatHeading(self, width = None):
         return ("{0:"+str(width)+"s}").format(self.heading) if width is not None else self.heading
 
     def format(self, data, width = None):
-        return self._buildFmtStr(width).format(*data)
+        return self._formatter(width)(*data)
 
 class ColorColumn(DataColumn):
     def __init__(self, *args, **kwargs):
@@ -153,6 +643,9 @@ class SpacerColumn(object):
     def getWidth(self, data):
         return len(self.spacer)
 
+    def fixedWidth(self):
+        return len(self.spacer)
+
     def format(self, data, width = None):
         return self.spacer
 
@@ -163,7 +656,7 @@ class Tabular(object):
     def __init__(self, *columns):
         self.columns = list(columns)
 
-    def render(self, dataMatrix):
+    def measure(self, dataMatrix):
         widths = [0] * len(self.columns)
         for row in dataMatrix:
             if row is None:
@@ -172,87 +665,399 @@ class Tabular(object):
                 currWidth = col.getWidth(row)
                 if currWidth > widths[i]:
                     widths[i] = currWidth
+        return widths
 
-        heading = ""
-        hline = ""
-        rows = [""]*len(dataMatrix)
-        for width, col in zip(widths, self.columns):
-            heading += col.formatHeading(width)
-            hline += col.formatHLine(width)
-            for i, row in enumerate(dataMatrix):
-                if row is None:
-                    rows[i] += col.formatHLine(width)
-                else:
-                    rows[i] += col.format(row, width)
+    def fixedWidths(self):
+        """
+        the widths the columns declare, for render without measuring.
+        """
+        return [col.fixedWidth() for col in self.columns]
 
-        print(heading)
-        print(hline)
-        for row in rows:
-            print(row)
+    def render(self, dataMatrix, out = None, widths = None):
+        """
+        writes the table to out (stdout by default). None rows are rendered
+        as horizontal lines.
 
-def parseCommits():
-    git = subprocess.Popen(["git", "log", "--format=oneline"],
-        stdout=subprocess.PIPE)
-    (output, error) = git.communicate()
+        if widths is given (one entry per column, ignored for spacers), the
+        measuring pass is skipped and the rows are written as they are taken
+        from dataMatrix, which may then be any iterable. cells wider than
+        their column break the alignment.
+        """
+        if out is None:
+            out = sys.stdout
+        if widths is None:
+            widths = self.measure(dataMatrix)
+        layout = list(zip(self.columns, widths))
+
+        hline = "".join(col.formatHLine(width) for col, width in layout)
+        out.write("".join(col.formatHeading(width) for col, width in layout) + "\n")
+        out.write(hline + "\n")
+        for row in dataMatrix:
+            if row is None:
+                out.write(hline + "\n")
+            else:
+                out.write("".join([col.format(row, width) for col, width in layout]) + "\n")
+
+# the profile counter each LINE_* kind is counted in
+LINE_COUNTERS = ("ignored", "whitelisted", "matched", "rejected", "rejected")
+
+class ProfilePhase(object):
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        import time
+        self.profile.stack.append(self.name)
+        self.start = time.perf_counter_ns()
+        self.cpuStart = time.process_time_ns()
+
+    def __exit__(self, *exc):
+        import time
+        wall = time.perf_counter_ns() - self.start
+        cpu = time.process_time_ns() - self.cpuStart
+        name = "/".join(self.profile.stack)
+        self.profile.stack.pop()
+        self.profile.add(name, wall, cpu, self.start, os.getpid())
+
+class Profile(object):
+    """
+    collects the wall and CPU time of the phases of a run and counts the
+    commit lines by their classification. nested phases are named after
+    their enclosing phases, e.g. parseCommits/git.
+    """
+    COUNTERS = ("seen", "matched", "ignored", "whitelisted", "rejected")
+
+    def __init__(self):
+        self.stack = []
+        # name -> [wall, cpu, calls, first start], times in nanoseconds
+        self.phases = {}
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.events = []
+
+    def phase(self, name):
+        return ProfilePhase(self, name)
+
+    def add(self, name, wall, cpu, start, pid):
+        totals = self.phases.setdefault(name, [0, 0, 0, start])
+        totals[0] += wall
+        totals[1] += cpu
+        totals[2] += 1
+        totals[3] = min(totals[3], start)
+        self.events.append((name, start, wall, cpu, pid))
+
+    def countLines(self, kindCounts):
+        """
+        adds the number of lines per LINE_* kind in kindCounts.
+        """
+        for kind, count in enumerate(kindCounts):
+            self.counters[LINE_COUNTERS[kind]] += count
+            self.counters["seen"] += count
+
+    def merge(self, other):
+        for name, start, wall, cpu, pid in other.events:
+            self.add(name, wall, cpu, start, pid)
+        for counter, count in other.counters.items():
+            self.counters[counter] += count
+
+    def printSummary(self, out=None):
+        print("{0:32s} {1:>12s} {2:>12s} {3:>6s}".format("phase", "wall [ms]", "cpu [ms]", "calls"), file=out)
+        for name, (wall, cpu, calls, start) in sorted(self.phases.items(), key=lambda x: x[1][3]):
+            print("{0:32s} {1:12.2f} {2:12.2f} {3:6d}".format(name, wall / 1e6, cpu / 1e6, calls), file=out)
+        print("lines: " + ", ".join("{0} {1}".format(self.counters[counter], counter)
+            for counter in self.COUNTERS), file=out)
+
+    def writeTrace(self, path):
+        """
+        writes the phases in the Chrome trace event format, which can be
+        loaded in chrome://tracing or Perfetto.
+        """
+        import json
+        events = [
+            {
+                "name": name.rpartition("/")[2],
+                "cat": "eval",
+                "ph": "X",
+                "ts": start / 1e3,
+                "dur": wall / 1e3,
+                "pid": pid,
+                "tid": pid,
+                "args": {"phase": name, "cpu_ms": cpu / 1e6},
+            }
+            for name, start, wall, cpu, pid in self.events
+        ]
+        if events:
+            events.append({
+                "name": "lines",
+                "ph": "C",
+                "ts": max(event["ts"] + event["dur"] for event in events),
+                "pid": os.getpid(),
+                "args": self.counters,
+            })
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+def splitRecords(stream, separator, chunkSize=65536):
+    pending = b""
+    chunk = stream.read1(chunkSize)
+    while chunk:
+        records = (pending + chunk).split(separator)
+        pending = records.pop()
+        for record in records:
+            yield record
+        chunk = stream.read1(chunkSize)
+    if pending:
+        yield pending
+
+def gitLog(revisions=None, audit=False, repository=None):
+    """
+    yields the lines of git log as they arrive, without the trailing
+    newline.
+
+    unless audit is set, git only emits commits which are no merges and whose
+    message contains a correction keyword, so the bulk of the history never
+    crosses the pipe. the audit mode emits every commit, so that all rejected
+    lines can be reported.
+    """
+    import subprocess
+    if audit:
+        command = ["git", "log", "--format=oneline"]
+        separator = b"\n"
+    else:
+        command = ["git", "log", "-z", "--format=%H %s", "--no-merges",
+                   "--regexp-ignore-case", "--extended-regexp",
+                   "--grep=" + gitCorrectionGrep]
+        separator = b"\0"
+    if revisions is not None:
+        command.append(revisions)
+    git = subprocess.Popen(command,
+        stdout=subprocess.PIPE,
+        cwd=repository)
+    try:
+        for record in splitRecords(git.stdout, separator):
+            yield record.decode("utf-8", errors="ignore")
+    finally:
+        # if the consumer stopped early, git dies from SIGPIPE
+        git.stdout.close()
+        git.wait()
     if git.returncode != 0:
         print("Git returned with a nonzero return code. Exiting and propagating return code.", file=sys.stderr)
         sys.exit(git.returncode)
-    output = output.decode("utf-8", errors="ignore")
-    lines = output.split("\n")
+
+def objectStoreLog(revisions=None, audit=False, repository=None):
+    """
+    yields the same records as gitLog, but reads the commits straight from
+    the object store. raises gitobjects.Unsupported if the repository layout
+    cannot be handled.
+    """
+    import gitobjects
+    store = gitobjects.Repository.discover(repository)
+    if revisions is None:
+        revisions = "HEAD"
+    exclude, sep, include = revisions.rpartition("..")
+    include = [store.resolve(include or "HEAD")]
+    exclude = [store.resolve(exclude or "HEAD")] if sep else []
+    grep = re.compile(gitCorrectionGrep, re.I | re.M)
+    for commit in store.walk(include, exclude):
+        if not audit and (len(commit.parents) > 1 or grep.search(commit.message) is None):
+            continue
+        yield "{0} {1}".format(commit.sha, commit.subject)
+
+def commitLog(revisions=None, audit=False, native=False, repository=None):
+    if not native:
+        yield from gitLog(revisions, audit, repository)
+        return
+    import gitobjects
+    # the object store walk yields the commits in the same order as git log,
+    # so after a failure the records git log starts with have been emitted
+    # already
+    emitted = 0
+    try:
+        for record in objectStoreLog(revisions, audit, repository):
+            emitted += 1
+            yield record
+        return
+    except gitobjects.Unsupported as err:
+        print("warn: cannot read the object store ({0}), falling back to git log.".format(err), file=sys.stderr)
+    yield from itertools.islice(gitLog(revisions, audit, repository), emitted, None)
+
+def parseCommits(revisions=None, audit=False, native=False, repository=None, profile=None):
+    """
+    yields an Acknowledgement for every correction in the history. with a
+    profile, the whole log is read up front so that reading and matching
+    can be timed separately.
+    """
+    lines = commitLog(revisions, audit, native, repository)
+    kindCounts = None
+    if profile is not None:
+        with profile.phase("git"):
+            lines = list(lines)
+        kindCounts = [0] * len(LINE_COUNTERS)
     commitWhitelistMatchCount = 0
-    acknowledgements = []
     for line in lines:
-        if looseMatch.match(line) is None:
-            if ignore.match(line) is None and not (len(line.rstrip().lstrip()) == 0):
-                commitIdMatch = extractCommitId.search(line)
-                if commitIdMatch is None or not commitIdMatch.group(0) in commitWhitelist:
-                    print("Line does not match loose match, ignoring: ", file=sys.stderr)
-                    print(line, file=sys.stderr)
-                else:
-                    commitWhitelistMatchCount += 1
+        kind, commitId, correction = classifyLine(line)
+        if kindCounts is not None:
+            kindCounts[kind] += 1
+        if kind == LINE_IGNORED:
             continue
-        match = corrected.match(line)
-        if match is None:
+        elif kind == LINE_WHITELISTED:
+            commitWhitelistMatchCount += 1
+            continue
+        elif kind == LINE_UNRECOGNIZED:
+            print("Line does not match loose match, ignoring: ", file=sys.stderr)
+            print(line, file=sys.stderr)
+            continue
+        elif kind == LINE_MALFORMED:
             print("Error: No match on required line.", file=sys.stderr)
             print(line, file=sys.stderr);
             sys.exit(1)
 
-        groups = match.groups()
-        if groups[0] in commitWhitelist:
-            commitWhitelistMatchCount += 1
-            continue
-
-        unit = None
-        person = None
-        if groups[4] is None:
-            unit = int(groups[7])
-            person = groups[6]
-        else:
-            unit = int(groups[4])
-            person = groups[5]
-        points = None
-        style = 0
-        if unit >= MIN_UNIT:
-            if groups[-2] is None:
-                points = float(groups[-4]) + float(groups[-3])
-                style = float(groups[-3])
-            else:
-                points = float(groups[-2])
+        unit, person, points, style, forced = correction
         if points == 0:
-            # print("Not acknowledging {0}. Zero points.".format(groups[0]), file=sys.stderr)
-            if groups[-1] == "!":
-                print("Not acknowledging {0} (zero points) as enforced by !".format(groups[0]), file=sys.stderr)
+            # print("Not acknowledging {0}. Zero points.".format(commitId), file=sys.stderr)
+            if forced:
+                print("Not acknowledging {0} (zero points) as enforced by !".format(commitId), file=sys.stderr)
                 points = None
                 style = None
             else:
-                print("warn: {0} has zero points. did you mean not to commit this one as corrected?".format(groups[0]), file=sys.stderr)
-        acknowledgements.append(Acknowledgement(unit, person, points, style))
+                print("warn: {0} has zero points. did you mean not to commit this one as corrected?".format(commitId), file=sys.stderr)
+        yield Acknowledgement(unit, person, points, style, commitId)
 
     if commitWhitelistMatchCount > 0:
         print("Ignored {0} commits which were on the whitelist.".format(commitWhitelistMatchCount), file=sys.stderr)
+    if kindCounts is not None:
+        profile.countLines(kindCounts)
+
+def gitOutput(*args, repository=None):
+    import subprocess
+    git = subprocess.Popen(["git"] + list(args),
+        stdout=subprocess.PIPE,
+        cwd=repository)
+    (output, error) = git.communicate()
+    if git.returncode != 0:
+        print("Git returned with a nonzero return code. Exiting and propagating return code.", file=sys.stderr)
+        sys.exit(git.returncode)
+    return output.decode("utf-8").strip()
+
+def gitRevParse(revision, repository=None):
+    import subprocess
+    git = subprocess.Popen(["git", "rev-parse", "--verify", "--quiet", revision],
+        stdout=subprocess.PIPE,
+        cwd=repository)
+    (output, error) = git.communicate()
+    if git.returncode != 0:
+        return None
+    return output.decode("ascii").strip()
+
+def isAncestor(ancestor, descendant, repository=None):
+    import subprocess
+    return subprocess.call(["git", "merge-base", "--is-ancestor", ancestor, descendant],
+        stderr=subprocess.DEVNULL,
+        cwd=repository) == 0
+
+def cacheKey():
+    """
+    everything which influences how a commit line is turned into an
+    acknowledgement. a cache created with a different key is discarded.
+    """
+    return (CACHE_VERSION, MIN_UNIT, tuple(commitWhitelist))
+
+def repositoryIdentity(repository=None):
+    """
+    identifies the repository a cache belongs to.
+    """
+    return os.path.realpath(repository or os.getcwd())
+
+def loadCache(path, repository=None):
+    import pickle
+    try:
+        with open(path, "rb") as f:
+            key, identity, tip, acknowledgements = pickle.load(f)
+    except (IOError, OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+        return (None, [])
+    if key != cacheKey():
+        return (None, [])
+    if identity != repositoryIdentity(repository):
+        print("Cache {0} belongs to {1}, discarding it.".format(path, identity), file=sys.stderr)
+        return (None, [])
+    return (tip, acknowledgements)
+
+def saveCache(path, tip, acknowledgements, repository=None):
+    import pickle
+    tmpPath = "{0}.{1}.tmp".format(path, os.getpid())
+    try:
+        with open(tmpPath, "wb") as f:
+            pickle.dump((cacheKey(), repositoryIdentity(repository), tip, acknowledgements), f)
+        os.replace(tmpPath, path)
+    except (IOError, OSError) as err:
+        print("warn: could not save cache to {0}: {1}".format(path, err), file=sys.stderr)
+        try:
+            os.unlink(tmpPath)
+        except OSError:
+            pass
+
+def hasMerges(tip, head, native=False, repository=None):
+    """
+    returns whether there is a merge commit in tip..head.
+    """
+    if native:
+        import gitobjects
+        try:
+            store = gitobjects.Repository.discover(repository)
+            return any(len(commit.parents) > 1 for commit in store.walk([head], [tip]))
+        except gitobjects.Unsupported:
+            pass
+    return gitOutput("rev-list", "--min-parents=2", "--max-count=1",
+        "{0}..{1}".format(tip, head), repository=repository) != ""
+
+def canExtend(tip, head, native=False, repository=None):
+    """
+    returns whether the acknowledgements of tip..head can be put in front of
+    the ones parsed up to tip to get the ones up to head.
+
+    git log orders by committer date. that order only continues the cached
+    one if head descends from tip in a straight line: a merged branch can
+    bring in corrections which are older than cached ones.
+    """
+    if not isAncestor(tip, head, repository):
+        print("Cached commit {0} is not an ancestor of HEAD anymore, discarding cache.".format(tip), file=sys.stderr)
+        return False
+    if hasMerges(tip, head, native, repository):
+        print("Commits have been merged since cached commit {0}, discarding cache.".format(tip), file=sys.stderr)
+        return False
+    return True
+
+def updateAcknowledgements(tip, acknowledgements, head, native=False, repository=None, profile=None):
+    """
+    brings the acknowledgements parsed from the history up to commit tip up
+    to date with commit head and returns them. they are parsed from scratch
+    if tip is None or canExtend does not hold.
+    """
+    if tip == head:
+        return acknowledgements
+    if tip is None or not canExtend(tip, head, native, repository):
+        return list(parseCommits(head, native=native, repository=repository, profile=profile))
+    return list(parseCommits("{0}..{1}".format(tip, head), native=native,
+        repository=repository, profile=profile)) + acknowledgements
+
+def parseCommitsCached(cachePath, native=False, repository=None, profile=None):
+    """
+    like parseCommits, but only parses the commits which are not in the cache
+    at cachePath yet. a relative cachePath is relative to the repository.
+    """
+    if repository is not None:
+        cachePath = os.path.join(repository, cachePath)
+    head = gitRevParse("HEAD", repository)
+    if head is None:
+        # let git log produce the error message and return code
+        return parseCommits(native=native, repository=repository, profile=profile)
+    tip, cached = loadCache(cachePath, repository)
+    acknowledgements = updateAcknowledgements(tip, cached, head, native, repository, profile)
+    if tip != head:
+        saveCache(cachePath, head, acknowledgements, repository)
     return acknowledgements
 
-def filterAcknowledgements(acknowledgements):
+def filterAcknowledgements(acknowledgements, verbose=True):
     filterSet = set()
     for ack in acknowledgements:
         t = (ack.unit, ack.person)
@@ -260,12 +1065,162 @@ def filterAcknowledgements(acknowledgements):
             continue
         filterSet.add(t)
         if ack.points is not None:
-            print("yes", ack)
+            if verbose:
+                print("yes", ack)
             yield ack
-        else:
+        elif verbose:
             print("no", ack)
 
-def getPersonData(acknowledgements):
+def commitTimes(commitIds, native=False, repository=None):
+    """
+    returns a dict mapping the given commit ids to their committer
+    timestamps.
+    """
+    if native:
+        import gitobjects
+        try:
+            store = gitobjects.Repository.discover(repository)
+            return dict((commitId, store.commit(commitId).time) for commitId in commitIds)
+        except gitobjects.Unsupported:
+            pass
+    import subprocess
+    git = subprocess.Popen(["git", "log", "--no-walk=unsorted", "--stdin", "--format=%H %ct"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        cwd=repository)
+    (output, error) = git.communicate("\n".join(commitIds).encode("ascii"))
+    if git.returncode != 0:
+        print("Git returned with a nonzero return code. Exiting and propagating return code.", file=sys.stderr)
+        sys.exit(git.returncode)
+    times = {}
+    for line in output.decode("ascii").split("\n"):
+        if line:
+            commitId, timestamp = line.split(" ")
+            times[commitId] = int(timestamp)
+    return times
+
+def parseRepository(path=".", audit=False, native=False, cachePath=None, profile=None):
+    """
+    parses the repository at path, using the cache at cachePath unless audit
+    is set. relative cache paths are relative to the repository.
+    """
+    if audit:
+        return parseCommits(audit=True, native=native, repository=path, profile=profile)
+    elif cachePath is not None:
+        return parseCommitsCached(cachePath, native=native, repository=path, profile=profile)
+    return parseCommits(native=native, repository=path, profile=profile)
+
+def evaluateRepository(path, audit=False, native=False, cachePath=None, profile=None):
+    """
+    parses the repository at path and returns the newest acknowledgement for
+    each (unit, person) as a list of (timestamp, acknowledgement) tuples.
+    """
+    if profile is not None:
+        with profile.phase("parseCommits"):
+            acknowledgements = list(parseRepository(path, audit, native, cachePath, profile))
+    else:
+        acknowledgements = parseRepository(path, audit, native, cachePath)
+    newest = []
+    seen = set()
+    for ack in acknowledgements:
+        t = (ack.unit, ack.person)
+        if t in seen:
+            continue
+        seen.add(t)
+        newest.append(ack)
+    if profile is not None:
+        with profile.phase("commitTimes"):
+            times = commitTimes([ack.commitId for ack in newest], native, path)
+    else:
+        times = commitTimes([ack.commitId for ack in newest], native, path)
+    return [(times[ack.commitId], ack) for ack in newest]
+
+def profileRepository(path, audit=False, native=False, cachePath=None):
+    """
+    evaluateRepository with profiling, for the worker processes. returns the
+    result together with the profile.
+    """
+    profile = Profile()
+    return (evaluateRepository(path, audit, native, cachePath, profile), profile)
+
+def mergeAcknowledgements(repositoryResults):
+    """
+    merges the results of evaluateRepository into one acknowledgement stream,
+    newest first. if a (unit, person) tuple occurs in several repositories,
+    the newest commit wins, just like within one repository.
+    """
+    newest = {}
+    for results in repositoryResults:
+        for timestamp, ack in results:
+            t = (ack.unit, ack.person)
+            if t not in newest or timestamp > newest[t][0]:
+                newest[t] = (timestamp, ack)
+    for timestamp, ack in sorted(newest.values(), key=lambda x: x[0], reverse=True):
+        yield ack
+
+def parseRepositories(paths, jobs=None, audit=False, native=False, cachePath=None, profile=None):
+    """
+    parses the repositories in parallel and merges their acknowledgements.
+    the phases of the workers are merged into profile.
+    """
+    import concurrent.futures
+    worker = evaluateRepository if profile is None else profileRepository
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(worker, os.path.abspath(path), audit, native, cachePath)
+            for path in paths
+        ]
+        results = [future.result() for future in futures]
+    if profile is not None:
+        for result, workerProfile in results:
+            profile.merge(workerProfile)
+        results = [result for result, workerProfile in results]
+    return mergeAcknowledgements(results)
+
+def loadAcknowledgements(repositories=(".",), jobs=None, audit=False, native=False,
+        cachePath=None, verbose=False, profile=None):
+    """
+    parses the given repositories and returns the acknowledgements which
+    count, the newest one per (unit, person). the options correspond to the
+    command line options of the same names; with verbose, the acknowledged
+    and rejected corrections are printed like on the command line. with a
+    profile, every stage runs to completion before the next one starts and
+    is timed.
+
+    a relative cachePath is relative to each repository; an absolute one
+    can only be used with a single repository.
+    """
+    if cachePath is not None and os.path.isabs(cachePath) and len(repositories) > 1:
+        raise ValueError("an absolute cache path cannot be shared by several repositories")
+    if len(repositories) > 1:
+        parse = lambda: parseRepositories(repositories, jobs, audit, native, cachePath, profile)
+        parsePhase = "parseRepositories"
+    else:
+        parse = lambda: parseRepository(repositories[0], audit, native, cachePath, profile)
+        parsePhase = "parseCommits"
+    if profile is None:
+        return filterAcknowledgements(parse(), verbose)
+    with profile.phase(parsePhase):
+        acknowledgements = list(parse())
+    with profile.phase("filterAcknowledgements"):
+        return list(filterAcknowledgements(acknowledgements, verbose))
+
+def loadPersonData(repositories=(".",), jobs=None, audit=False, native=False,
+        cachePath=None, columnar=False, verbose=False, profile=None):
+    """
+    loadAcknowledgements and getPersonData in one go.
+    """
+    acknowledgements = loadAcknowledgements(repositories, jobs, audit, native,
+        cachePath, verbose, profile)
+    if profile is None:
+        return getPersonData(acknowledgements, columnar)
+    with profile.phase("getPersonData"):
+        return getPersonData(acknowledgements, columnar)
+
+def getPersonData(acknowledgements, columnar=False):
+    if columnar:
+        cohort = Cohort(acknowledgements)
+        return (cohort, cohort.maxUnit, cohort.maxNameLen)
     personMap = {}
     maxUnit = 0
     maxNameLen = 0
@@ -278,12 +1233,37 @@ def getPersonData(acknowledgements):
         personData.add(ack)
     return (sorted(personMap.values(), key=lambda x: x.person), maxUnit, maxNameLen)
 
-def printData(personData, currentUnit, maxNameLen, showState):
+def personState(stats, i):
+    """
+    returns the state of the i-th person of a CohortState, one of passed,
+    failed, unlikely and okay.
+    """
+    if stats.passed[i]:
+        return "passed"
+    elif not (stats.canPassBySubmissions[i] and stats.canPassByPoints[i]):
+        return "failed"
+    elif not stats.mayPassByPoints[i]:
+        return "unlikely"
+    return "okay"
+
+def evaluate(personData, currentUnit):
+    if isinstance(personData, Cohort):
+        return personData.evaluate(currentUnit)
+    return evaluatePersons(personData, currentUnit)
+
+def printData(personData, currentUnit, maxNameLen, showState, out=None, stream=False):
+    """
+    prints the results table. with stream, the column widths are not
+    measured but derived from maxNameLen and the usual widths of the
+    values, and every row is written as soon as it has been formatted.
+    """
+    if out is None:
+        out = sys.stdout
     remainingUnits = (MAX_UNIT - currentUnit)
-    print("The {0}{2}th{1} unit out of {0}{3}{1} has passed. Thus, {0}{4}{1} are remaining.".format(bcolors.EMPH, bcolors.ENDC, currentUnit, MAX_UNIT, remainingUnits))
-    print("Currently, {0}{2:4.1f}{1} more points can be reached.".format(bcolors.EMPH, bcolors.ENDC, remainingUnits * MAX_POINTS_PER_SUBMISSION))
+    print("The {0}{2}th{1} unit out of {0}{3}{1} has passed. Thus, {0}{4}{1} are remaining.".format(bcolors.EMPH, bcolors.ENDC, currentUnit, MAX_UNIT, remainingUnits), file=out)
+    print("Currently, {0}{2:4.1f}{1} more points can be reached.".format(bcolors.EMPH, bcolors.ENDC, remainingUnits * MAX_POINTS_PER_SUBMISSION), file=out)
     # print("One can still pass with an amount of at least {0} submissions.".format(MAX_UNIT - currentUnit))
-    print("Current results:")
+    print("Current results:", file=out)
     """nameheading = "Surname"
     if len(nameheading) > maxNameLen:
         maxNameLen = len(nameheading)
@@ -297,58 +1277,52 @@ def printData(personData, currentUnit, maxNameLen, showState):
 
     defaultSpacer = SpacerColumn(" │ ", "─┼─")
     table = Tabular(
-        ColorColumn("name", 0),
+        ColorColumn("name", 0, width=maxNameLen),
         SpacerColumn(" ║ ", "─╫─"),
-        ColorColumn("pts", 1, precision="4"),
+        ColorColumn("pts", 1, precision="4", width=5),
         defaultSpacer,
-        DataColumn("rel", 2, precision="2"),
+        DataColumn("rel", 2, precision="2", width=4),
         defaultSpacer,
-        DataColumn("avg", 8, precision="3"),
+        DataColumn("avg", 8, precision="3", width=5),
         defaultSpacer,
-        ColorColumn("miss", 3),
+        ColorColumn("miss", 3, width=5),
         defaultSpacer,
-        ColorColumn("avgneed", 9, precision="3"),
+        ColorColumn("avgneed", 9, precision="3", width=5),
         defaultSpacer,
-        ColorColumn("units", 4),
+        ColorColumn("units", 4, width=2),
         defaultSpacer,
-        DataColumn("rel", 5, precision="2"),
+        DataColumn("rel", 5, precision="2", width=4),
         defaultSpacer,
-        ColorColumn("miss", 6)
+        ColorColumn("miss", 6, width=2)
     )
     if showState:
         table.columns.append(defaultSpacer)
-        table.columns.append(ColorColumn("state", 7))
+        table.columns.append(ColorColumn("state", 7, width=max(len(state) for state in SIMULATION_STATES)))
 
-    dataMatrix = []
+    stats = evaluate(personData, currentUnit)
+    stateColors = {
+        "passed": bcolors.PASSED,
+        "failed": bcolors.CANNOT_PASS,
+        "unlikely": bcolors.WARNING,
+        "okay": bcolors.OKBLUE,
+    }
 
-    totalPts = 0.
-    totalAvg = 0.
-    totalSubsCount = 0
-    totalMissingPts = 0.
-    totalMissingSubs = 0
-    totalNeededAvg = 0.
-    totalStyle = 0.
+    def rows():
+        for i in range(len(stats)):
+            yield row(i)
+        yield None
+        yield total
 
-    for person in personData:
-        pts = person.pointSum
-        subs = len(person.submissions)
-        canPassBySubmissions, canPassByPoints = person.canPass(currentUnit)
-        avgPts, mayPassByPoints = person.mayPass(currentUnit)
-        color = ""
-        state = ""
-        if person.passed():
-            color = bcolors.PASSED
-            state = "passed"
-        elif not (canPassBySubmissions and canPassByPoints):
-            color = bcolors.CANNOT_PASS
-            state = "failed"
-        elif not mayPassByPoints:
-            color = bcolors.WARNING
-            state = "unlikely"
-        else:
-            color = bcolors.OKBLUE
-            state = "okay"
-        # print("{0}{1}{2}".format(color, person.person, bcolors.ENDC))
+    def row(i):
+        pts = stats.pointSum[i]
+        subs = stats.submissionCount[i]
+        canPassBySubmissions = stats.canPassBySubmissions[i]
+        canPassByPoints = stats.canPassByPoints[i]
+        avgPts = stats.avgPts[i]
+        mayPassByPoints = stats.mayPassByPoints[i]
+        state = personState(stats, i)
+        color = stateColors[state]
+        # print("{0}{1}{2}".format(color, stats.person[i], bcolors.ENDC))
 
         ptscolor = bcolors.ENDC
         ptsmissingcolor = bcolors.ENDC
@@ -366,64 +1340,598 @@ def printData(personData, currentUnit, maxNameLen, showState):
         elif not canPassBySubmissions:
             subsmissingcolor = bcolors.CANNOT_PASS
 
-        missingPts = max(0., MIN_POINTS - pts)
-        missingSubs = max(0, MIN_SUBMISSIONS - subs)
-        neededAvg = missingPts / remainingUnits if remainingUnits > 0 else float("NaN")
-
-        dataMatrix.append((
-            ColoredString(person.person, color),
+        return (
+            ColoredString(stats.person[i], color),
             ColoredString(float(pts), ptscolor),
             (float(pts) / MIN_POINTS),
-            ColoredString(missingPts, ptsmissingcolor),
+            ColoredString(stats.missingPts[i], ptsmissingcolor),
             ColoredString(subs, subscolor),
             (float(subs) / MIN_SUBMISSIONS),
-            ColoredString(missingSubs, subsmissingcolor),
+            ColoredString(stats.missingSubs[i], subsmissingcolor),
             ColoredString(state, color),
             float(avgPts),
-            ColoredString(float(neededAvg), ptsmissingcolor)
-        ))
+            ColoredString(float(stats.neededAvg[i]), ptsmissingcolor)
+        )
 
-        totalPts += pts
-        totalSubsCount += subs
-        totalAvg += avgPts
-        if canPassByPoints:
-            totalMissingPts += max(0., MIN_POINTS - pts)
-        if canPassBySubmissions:
-            totalMissingSubs += max(0., MIN_SUBMISSIONS - subs)
-        totalNeededAvg += neededAvg
-        totalStyle += person.style
-
-    if len(dataMatrix) > 0:
-        totalAvg /= len(dataMatrix)
-        totalNeededAvg /= len(dataMatrix)
-    dataMatrix.append(None)
-    dataMatrix.append((
-        ColoredString("total", ""),
-        ColoredString(totalPts, ""),
-        float('nan'),
-        ColoredString(totalMissingPts, ""),
-        ColoredString(totalSubsCount, ""),
-        float('nan'),
-        ColoredString(totalMissingSubs, ""),
-        ColoredString("", ""),
-        totalAvg,
-        ColoredString(totalNeededAvg, bcolors.CANNOT_PASS if totalNeededAvg > MAX_POINTS_PER_SUBMISSION else bcolors.ENDC)
-    ))
+    def totalRow():
+        totalNeededAvg = stats.totalNeededAvg
+        return (
+            ColoredString("total", ""),
+            ColoredString(stats.totalPts, ""),
+            float('nan'),
+            ColoredString(stats.totalMissingPts, ""),
+            ColoredString(stats.totalSubsCount, ""),
+            float('nan'),
+            ColoredString(stats.totalMissingSubs, ""),
+            ColoredString("", ""),
+            stats.totalAvg,
+            ColoredString(totalNeededAvg, bcolors.CANNOT_PASS if totalNeededAvg > MAX_POINTS_PER_SUBMISSION else bcolors.ENDC)
+        )
 
-    table.render(dataMatrix)
+    total = totalRow()
+    if stream:
+        # the totals are known before the first row is written and usually
+        # need more room than the rows of a single person
+        widths = [max(fixed, measured) for fixed, measured in
+            zip(table.fixedWidths(), table.measure([total]))]
+        table.render(rows(), out, widths)
+    else:
+        table.render(list(rows()), out)
     try:
-        print("Average style points: {0}".format(totalStyle / totalSubsCount))
+        print("Average style points: {0}".format(stats.totalStyle / stats.totalSubsCount), file=out)
     except ZeroDivisionError:
         pass
 
-parser = argparse.ArgumentParser(
-    formatter_class=argparse.RawDescriptionHelpFormatter,
-    description="""
+def printCsv(personData, out=None):
+    print('"Nachname","Punkte","Abgaben","bestanden"', file=out)
+    for person in personData:
+        print('"{0}","{1}","{2}","{3}"'.format(person.person, person.pointSum, len(person.submissions), person.passed()), file=out)
+
+def jsonData(personData, currentUnit):
+    stats = evaluate(personData, currentUnit)
+    return {
+        "currentUnit": currentUnit,
+        "maxUnit": MAX_UNIT,
+        "persons": [
+            {
+                "name": stats.person[i],
+                "points": stats.pointSum[i],
+                "submissions": stats.submissionCount[i],
+                "style": stats.style[i],
+                "average": stats.avgPts[i],
+                "missingPoints": stats.missingPts[i],
+                "missingSubmissions": stats.missingSubs[i],
+                "neededAverage": None if stats.neededAvg[i] != stats.neededAvg[i] else stats.neededAvg[i],
+                "state": personState(stats, i),
+            }
+            for i in range(len(stats))
+        ],
+    }
+
+"""
+the per-person fields of the exports, in the order of the printData columns,
+with the array type code they are stored with in the columnar format. the
+state is stored as index into SIMULATION_STATES, the name as UTF-8.
+"""
+EXPORT_FIELDS = (
+    ("name", None),
+    ("points", "d"),
+    ("relPoints", "d"),
+    ("average", "d"),
+    ("missingPoints", "d"),
+    ("neededAverage", "d"),
+    ("submissions", "q"),
+    ("relSubmissions", "d"),
+    ("missingSubmissions", "q"),
+    ("state", "B"),
+    ("style", "d"),
+)
+
+EXPORT_FORMATS = ("jsonl", "csv", "columnar")
+
+COLUMNAR_MAGIC = b"EVALCOL\x01"
+
+def exportData(personData, currentUnit):
+    """
+    computes everything the exports contain. returns (units, rows), where
+    rows holds a tuple per person with a value per EXPORT_FIELDS entry
+    followed by the points of every unit in units, None where nothing has
+    been acknowledged. undefined values (the needed average once all units
+    have passed) are None, too.
+    """
+    stats = evaluate(personData, currentUnit)
+    scores = [dict(person.submissions) for person in personData]
+    units = sorted(set(unit for personScores in scores for unit in personScores))
+    rows = []
+    for i in range(len(stats)):
+        pts = float(stats.pointSum[i])
+        subs = stats.submissionCount[i]
+        neededAvg = float(stats.neededAvg[i])
+        rows.append((
+            stats.person[i],
+            pts,
+            pts / MIN_POINTS,
+            float(stats.avgPts[i]),
+            float(stats.missingPts[i]),
+            None if neededAvg != neededAvg else neededAvg,
+            subs,
+            float(subs) / MIN_SUBMISSIONS,
+            int(stats.missingSubs[i]),
+            personState(stats, i),
+            float(stats.style[i]),
+        ) + tuple(scores[i].get(unit) for unit in units))
+    return (units, rows)
+
+def writeJsonLines(units, rows, out):
+    import json
+    fieldCount = len(EXPORT_FIELDS)
+    names = [name for name, typeCode in EXPORT_FIELDS]
+    for row in rows:
+        record = dict(zip(names, row))
+        record["scores"] = dict((str(unit), points)
+            for unit, points in zip(units, row[fieldCount:]) if points is not None)
+        out.write(json.dumps(record))
+        out.write("\n")
+
+def writeCsv(units, rows, out):
+    import csv
+    writer = csv.writer(out)
+    writer.writerow([name for name, typeCode in EXPORT_FIELDS] +
+        ["unit{0}".format(unit) for unit in units])
+    writer.writerows(rows)
+
+def writeColumnar(units, rows, currentUnit, out):
+    """
+    writes the rows column by column: the magic bytes, the length of the
+    JSON header as little endian 64 bit integer, the header and the columns
+    as little endian arrays, each aligned to 8 bytes. the header lists the
+    offset (relative to the first column), type code and length of every
+    column. the names are stored as nameOffsets (count + 1 offsets) into
+    nameData, the scores as one row of len(units) doubles per person, NaN
+    where nothing has been acknowledged.
+    """
+    import json
+    import struct
+    columns = []
+    for i, (name, typeCode) in enumerate(EXPORT_FIELDS):
+        if name == "name":
+            nameData = bytearray()
+            nameOffsets = array.array("q", [0])
+            for row in rows:
+                nameData += row[i].encode("utf-8")
+                nameOffsets.append(len(nameData))
+            columns.append(("nameOffsets", nameOffsets))
+            columns.append(("nameData", array.array("B", nameData)))
+        elif name == "state":
+            columns.append((name, array.array("B", (SIMULATION_STATES.index(row[i]) for row in rows))))
+        elif name == "neededAverage":
+            columns.append((name, array.array("d",
+                (float("nan") if row[i] is None else row[i] for row in rows))))
+        else:
+            columns.append((name, array.array(typeCode, (row[i] for row in rows))))
+    fieldCount = len(EXPORT_FIELDS)
+    columns.append(("scores", array.array("d",
+        (float("nan") if points is None else points
+         for row in rows for points in row[fieldCount:]))))
+
+    header = {
+        "currentUnit": currentUnit,
+        "count": len(rows),
+        "units": units,
+        "states": list(SIMULATION_STATES),
+        "columns": [],
+    }
+    offset = 0
+    for name, column in columns:
+        size = len(column) * column.itemsize
+        header["columns"].append({"name": name, "type": column.typecode,
+            "offset": offset, "length": len(column)})
+        offset += size + -size % 8
+    headerData = json.dumps(header).encode("utf-8")
+    headerData += b" " * (-len(headerData) % 8)
+    out.write(COLUMNAR_MAGIC)
+    out.write(struct.pack("<Q", len(headerData)))
+    out.write(headerData)
+    for name, column in columns:
+        if sys.byteorder == "big" and column.itemsize > 1:
+            column.byteswap()
+        data = column.tobytes()
+        out.write(data)
+        out.write(b"\0" * (-len(data) % 8))
+
+def loadColumnar(path):
+    """
+    reads a file written by writeColumnar. returns the header and a dict
+    mapping the column names to arrays; the names are decoded to a list of
+    strings under "name" and the states to a list of state names.
+    """
+    import json
+    import struct
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:len(COLUMNAR_MAGIC)] != COLUMNAR_MAGIC:
+        raise ValueError("{0} is not a columnar export".format(path))
+    headerLength, = struct.unpack_from("<Q", data, len(COLUMNAR_MAGIC))
+    start = len(COLUMNAR_MAGIC) + 8
+    header = json.loads(data[start:start+headerLength].decode("utf-8"))
+    start += headerLength
+    columns = {}
+    for column in header["columns"]:
+        values = array.array(column["type"])
+        offset = start + column["offset"]
+        values.frombytes(data[offset:offset + column["length"] * values.itemsize])
+        if sys.byteorder == "big" and values.itemsize > 1:
+            values.byteswap()
+        columns[column["name"]] = values
+    nameData = columns.pop("nameData").tobytes()
+    nameOffsets = columns.pop("nameOffsets")
+    columns["name"] = [nameData[nameOffsets[i]:nameOffsets[i+1]].decode("utf-8")
+        for i in range(header["count"])]
+    columns["state"] = [header["states"][state] for state in columns["state"]]
+    return (header, columns)
+
+def export(personData, currentUnit, exportFormat, path=None):
+    """
+    writes all metrics of personData in exportFormat, one of EXPORT_FORMATS,
+    to path or to stdout.
+    """
+    units, rows = exportData(personData, currentUnit)
+    if exportFormat == "columnar":
+        if path is None:
+            writeColumnar(units, rows, currentUnit, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+        else:
+            with open(path, "wb") as out:
+                writeColumnar(units, rows, currentUnit, out)
+        return
+    writer = writeCsv if exportFormat == "csv" else writeJsonLines
+    if path is None:
+        writer(units, rows, sys.stdout)
+    else:
+        with open(path, "w", newline="", encoding="utf-8") as out:
+            writer(units, rows, out)
+
+class EvaluationDaemon(object):
+    """
+    keeps the evaluation of the repository (the current directory by
+    default) in memory. the refs are polled for changes, and only the commits
+    which are new since the last update are parsed and applied to the
+    per-person data.
+    """
+    def __init__(self, native=False, columnar=False, showState=False, interval=1.0, repository=None):
+        import threading
+        self.repository = repository
+        self.native = native
+        self.columnar = columnar
+        self.showState = showState
+        self.interval = interval
+        self.gitDir = gitOutput("rev-parse", "--absolute-git-dir", repository=repository)
+        self.lock = threading.Lock()
+        self.tip = None
+        # the newest acknowledgement per (unit, person), and the PersonData
+        # of the ones which count
+        self.newest = {}
+        self.persons = {}
+        self.unitCounts = {}
+        self.evaluation = None
+        self.outputs = {}
+        self.signature = self.refsSignature()
+        self.update()
+
+    def refsSignature(self):
+        signature = []
+        paths = [os.path.join(self.gitDir, "HEAD"), os.path.join(self.gitDir, "packed-refs")]
+        for dirpath, dirnames, filenames in os.walk(os.path.join(self.gitDir, "refs")):
+            paths.extend(os.path.join(dirpath, filename) for filename in filenames)
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            signature.append((path, st.st_mtime_ns, st.st_size))
+        return signature
+
+    def update(self):
+        head = gitRevParse("HEAD", self.repository)
+        if head is None or head == self.tip:
+            return
+        reset = self.tip is None or not canExtend(self.tip, head, self.native, self.repository)
+        if reset:
+            acknowledgements = parseCommits(head, native=self.native, repository=self.repository)
+        else:
+            acknowledgements = parseCommits("{0}..{1}".format(self.tip, head),
+                native=self.native, repository=self.repository)
+        acknowledgements = list(acknowledgements)
+        with self.lock:
+            if reset:
+                self.newest = {}
+                self.persons = {}
+                self.unitCounts = {}
+            self.apply(acknowledgements)
+            self.tip = head
+            self.evaluation = self.personData()
+            self.outputs = {}
+
+    def apply(self, acknowledgements):
+        """
+        applies acknowledgements which are newer than all applied ones,
+        newest first, like filterAcknowledgements would.
+        """
+        applied = set()
+        for ack in acknowledgements:
+            t = (ack.unit, ack.person)
+            if t in applied:
+                continue
+            applied.add(t)
+            previous = self.newest.get(t)
+            if previous is not None and previous.points is not None:
+                person = self.persons[previous.person]
+                person.remove(previous)
+                if not person.submissions:
+                    del self.persons[previous.person]
+                self.unitCounts[previous.unit] -= 1
+            self.newest[t] = ack
+            if ack.points is not None:
+                self.persons.setdefault(ack.person, PersonData(ack.person)).add(ack)
+                self.unitCounts[ack.unit] = self.unitCounts.get(ack.unit, 0) + 1
+
+    def personData(self):
+        """
+        returns the current data like getPersonData does.
+        """
+        if self.columnar:
+            cohort = Cohort(ack for ack in self.newest.values() if ack.points is not None)
+            return (cohort, cohort.maxUnit, cohort.maxNameLen)
+        maxUnit = max((unit for unit, count in self.unitCounts.items() if count > 0), default=0)
+        maxNameLen = max((len(person) for person in self.persons), default=0)
+        return (sorted(self.persons.values(), key=lambda x: x.person), maxUnit, maxNameLen)
+
+    def watch(self):
+        import time
+        while True:
+            time.sleep(self.interval)
+            signature = self.refsSignature()
+            if signature != self.signature:
+                self.signature = signature
+                try:
+                    self.update()
+                except (Exception, SystemExit) as err:
+                    # the git helpers exit on errors; keep serving the last
+                    # evaluation and try again on the next poll
+                    print("warn: could not update the evaluation ({0!r}), retrying.".format(err), file=sys.stderr)
+                    self.signature = None
+
+    def render(self, outputFormat):
+        with self.lock:
+            try:
+                return self.outputs[outputFormat]
+            except KeyError:
+                pass
+            personData, maxUnit, maxNameLen = self.evaluation
+            if outputFormat == "json":
+                import json
+                output = json.dumps(jsonData(personData, maxUnit))
+            else:
+                import io
+                buf = io.StringIO()
+                if outputFormat == "csv":
+                    printCsv(personData, buf)
+                else:
+                    printData(personData, maxUnit, maxNameLen, self.showState, buf)
+                output = buf.getvalue()
+            self.outputs[outputFormat] = output
+            return output
+
+def parseAddress(address):
+    """
+    parses a --serve address: returns the path of a unix socket if address
+    contains a slash, a tuple (host, port) for [HOST:]PORT and raises
+    ValueError otherwise.
+    """
+    if "/" in address:
+        return address
+    host, _, port = address.rpartition(":")
+    if not port.isdigit() or int(port) > 65535:
+        raise ValueError("expected [HOST:]PORT or the path of a unix socket, got {0!r} \
+(use ./{0} for a socket in the current directory)".format(address))
+    return (host or "127.0.0.1", int(port))
+
+def serve(evaluation, address):
+    """
+    serves the table, CSV and JSON output of evaluation on address, as
+    returned by parseAddress.
+    """
+    import threading
+    # the table is served to HTTP clients, not to a terminal
+    bcolors.disable(bcolors)
+    server = lazyImport("evalserver").createServer(evaluation, address)
+    watcher = threading.Thread(target=evaluation.watch, daemon=True)
+    watcher.start()
+    print("serving on {0}".format(address if isinstance(address, str) else "{0}:{1}".format(*address)), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+"""
+grading rules which can be varied in a simulation, with their types.
+PASS_RATIO is a shorthand which sets MIN_POINTS to MAX_POINTS * PASS_RATIO.
+"""
+SIMULATION_PARAMETERS = {
+    "MIN_SUBMISSIONS": int,
+    "MAX_UNIT": int,
+    "MIN_POINTS": float,
+    "MAX_POINTS_PER_SUBMISSION": float,
+    "PASS_RATIO": float,
+}
+
+SIMULATION_STATES = ("passed", "okay", "unlikely", "failed")
+
+# number of scenarios evaluated in one vectorized pass, bounds the memory use
+SIMULATION_CHUNK = 1024
+
+def parseScenarioAxis(spec):
+    """
+    parses NAME=VALUES, where VALUES is either a comma separated list or an
+    inclusive range START:STOP:STEP.
+    """
+    name, sep, values = spec.partition("=")
+    name = name.strip().upper().replace("-", "_")
+    if not sep or name not in SIMULATION_PARAMETERS:
+        raise ValueError("expected one of {0} followed by =VALUES, got {1!r}".format(
+            ", ".join(sorted(SIMULATION_PARAMETERS)), spec))
+    valueType = SIMULATION_PARAMETERS[name]
+    if ":" in values:
+        start, stop, step = (float(value) for value in values.split(":"))
+        if step <= 0:
+            raise ValueError("step must be positive in {0!r}".format(spec))
+        count = int((stop - start) / step + 1e-9) + 1
+        values = [valueType(round(start + i * step, 9)) for i in range(count)]
+    else:
+        values = [valueType(value) for value in values.split(",")]
+    return (name, values)
+
+def scenarioGrid(axes):
+    """
+    returns the cartesian product of the axes as list of dicts which map
+    every rule to its value, using the module constants for the rules which
+    are not varied.
+    """
+    names = [name for name, values in axes]
+    if "PASS_RATIO" in names and "MIN_POINTS" in names:
+        raise ValueError("PASS_RATIO and MIN_POINTS cannot be varied at the same time")
+    scenarios = []
+    for values in itertools.product(*(values for name, values in axes)):
+        scenario = {
+            "MIN_SUBMISSIONS": MIN_SUBMISSIONS,
+            "MAX_UNIT": MAX_UNIT,
+            "MIN_POINTS": MIN_POINTS,
+            "MAX_POINTS_PER_SUBMISSION": MAX_POINTS_PER_SUBMISSION,
+        }
+        scenario.update(zip(names, values))
+        if "PASS_RATIO" in scenario:
+            scenario["MIN_POINTS"] = MAX_POINTS * scenario["PASS_RATIO"]
+        scenarios.append(scenario)
+    return scenarios
+
+def simulate(personData, currentUnit, scenarios):
+    """
+    classifies every person like printData does for each scenario. returns
+    one tuple of counts per scenario, ordered like SIMULATION_STATES.
+    """
+    pts = [float(person.pointSum) for person in personData]
+    subs = [len(person.submissions) for person in personData]
+    numpy = lazyImport("numpy")
+    if numpy is None:
+        return [simulateScenario(pts, subs, currentUnit, scenario) for scenario in scenarios]
+
+    pts = numpy.array(pts)[numpy.newaxis, :]
+    subs = numpy.array(subs, dtype=numpy.int64)[numpy.newaxis, :]
+    avgPts = numpy.zeros(pts.shape)
+    numpy.divide(pts, subs, out=avgPts, where=subs > 0)
+    counts = []
+    for offset in range(0, len(scenarios), SIMULATION_CHUNK):
+        chunk = scenarios[offset:offset+SIMULATION_CHUNK]
+        column = lambda name: numpy.array([scenario[name] for scenario in chunk])[:, numpy.newaxis]
+        minSubmissions = column("MIN_SUBMISSIONS")
+        minPoints = column("MIN_POINTS")
+        maxPointsPerSubmission = column("MAX_POINTS_PER_SUBMISSION")
+        remainingUnits = column("MAX_UNIT") - currentUnit
+
+        passed = (pts >= minPoints) & (subs >= minSubmissions)
+        canPass = ((minSubmissions - (subs + remainingUnits)) <= 0) & \
+            (((pts - minPoints) + remainingUnits * maxPointsPerSubmission) >= 0)
+        mayPass = (minPoints - pts) <= remainingUnits * avgPts
+        failed = ~passed & ~canPass
+        unlikely = ~passed & canPass & ~mayPass
+        okay = ~passed & canPass & mayPass
+        counts.extend(zip(*(state.sum(axis=1).tolist() for state in (passed, okay, unlikely, failed))))
+    return counts
+
+def simulateScenario(pts, subs, currentUnit, scenario):
+    minSubmissions = scenario["MIN_SUBMISSIONS"]
+    minPoints = scenario["MIN_POINTS"]
+    remainingUnits = scenario["MAX_UNIT"] - currentUnit
+    maxPoints = remainingUnits * scenario["MAX_POINTS_PER_SUBMISSION"]
+    passed = okay = unlikely = failed = 0
+    for personPts, personSubs in zip(pts, subs):
+        avgPts = personPts / personSubs if personSubs > 0 else 0.
+        if personPts >= minPoints and personSubs >= minSubmissions:
+            passed += 1
+        elif not ((minSubmissions - (personSubs + remainingUnits)) <= 0 and ((personPts - minPoints) + maxPoints) >= 0):
+            failed += 1
+        elif not (minPoints - personPts) <= remainingUnits * avgPts:
+            unlikely += 1
+        else:
+            okay += 1
+    return (passed, okay, unlikely, failed)
+
+def printSimulation(axes, scenarios, counts, csvOutput=False):
+    names = [name for name, values in axes]
+    if csvOutput:
+        print(",".join('"{0}"'.format(heading) for heading in names + list(SIMULATION_STATES)))
+        for scenario, scenarioCounts in zip(scenarios, counts):
+            values = [scenario[name] for name in names]
+            print(",".join('"{0}"'.format(value) for value in values + list(scenarioCounts)))
+        return
+
+    defaultSpacer = SpacerColumn(" │ ", "─┼─")
+    columns = []
+    for i, name in enumerate(names):
+        columns.append(DataColumn(name.lower(), i))
+        columns.append(defaultSpacer)
+    columns[-1] = SpacerColumn(" ║ ", "─╫─")
+    for i, state in enumerate(SIMULATION_STATES):
+        columns.append(DataColumn(state, len(names) + i))
+        columns.append(defaultSpacer)
+    table = Tabular(*columns[:-1])
+
+    dataMatrix = []
+    for scenario, scenarioCounts in zip(scenarios, counts):
+        values = [scenario[name] for name in names]
+        dataMatrix.append(tuple(values) + tuple(scenarioCounts))
+    table.render(dataMatrix)
+
+def unitSeries(index):
+    """
+    yields a tuple (unit, students, submissions, points, average points,
+    passed, okay, unlikely, failed) for every unit which has been corrected,
+    each computed as of that unit.
+    """
+    for unit in index.units():
+        stats = index.snapshot(unit).evaluate(unit)
+        states = [personState(stats, i) for i in range(len(stats))]
+        yield (unit, len(stats), stats.totalSubsCount, stats.totalPts, stats.totalAvg) + \
+            tuple(states.count(state) for state in SIMULATION_STATES)
+
+def printSeries(index, csvOutput=False):
+    headings = ["unit", "students", "subs", "pts", "avg"] + list(SIMULATION_STATES)
+    if csvOutput:
+        print(",".join('"{0}"'.format(heading) for heading in headings))
+        for row in unitSeries(index):
+            print(",".join('"{0}"'.format(value) for value in row))
+        return
+
+    precisions = {"pts": "4", "avg": "3"}
+    defaultSpacer = SpacerColumn(" │ ", "─┼─")
+    columns = [DataColumn("unit", 0), SpacerColumn(" ║ ", "─╫─")]
+    for i, heading in enumerate(headings[1:], 1):
+        columns.append(DataColumn(heading, i, precision=precisions.get(heading)))
+        columns.append(defaultSpacer)
+    Tabular(*columns[:-1]).render(list(unitSeries(index)))
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description="""
 Parses git commit messages and calculates some statistics for the students.
 Students are automatically added as they're found in the commitlog. Only the
 newest commit for given unit and student tuple is taken into account. For
 supported commit message formats, see below.""",
-    epilog="""Supported commit formats:
+        epilog="""Supported commit formats:
 
     Corrected UNIT/NAME: PTS1 + PTS2 = PTSSUM
     Amended correction UNIT/NAME: PTS1 + PTS2 = PTSSUM
@@ -436,35 +1944,217 @@ PTSSUM is the sum of the points achieved (this is checked, so don't mess with
 it).
 """)
 
-parser.add_argument(
-    '-s', '--show-state',
-    action='store_true',
-    dest='showState',
-    help="Show an additional column describing the state of the student (one \
+    parser.add_argument(
+        '-s', '--show-state',
+        action='store_true',
+        dest='showState',
+        help="Show an additional column describing the state of the student (one \
 of okay, unlikely, failed, passed)"
-)
-parser.add_argument(
-    '-c', '--csv',
-    action='store_true',
-    dest='csvOutput',
-    help="Give the relevant data in CSV output. Columns are headed properly, \
+    )
+    parser.add_argument(
+        '-c', '--csv',
+        action='store_true',
+        dest='csvOutput',
+        help="Give the relevant data in CSV output. Columns are headed properly, \
 in German though."
-)
-parser.add_argument(
-    '-n', '--no-color',
-    action='store_true',
-    dest='noColor',
-    help="Do not use ANSI colour codes in the output."
-)
-args = parser.parse_args(sys.argv[1:])
-if args.noColor:
-    bcolors.disable(bcolors)
+    )
+    parser.add_argument(
+        '-n', '--no-color',
+        action='store_true',
+        dest='noColor',
+        help="Do not use ANSI colour codes in the output."
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        dest='stream',
+        help="Write the table rows as soon as they are computed, with fixed \
+column widths instead of measuring all rows first. Unusually wide values \
+break the alignment."
+    )
+    parser.add_argument(
+        '--cache',
+        dest='cacheFile',
+        metavar='FILE',
+        help="Keep the parsed corrections in FILE and only parse commits which \
+are newer than the cached ones on subsequent runs. The cache is discarded \
+automatically if the history has been rewritten or branches have been merged \
+since. Must be relative if several repositories are given."
+    )
+    parser.add_argument(
+        '--audit',
+        action='store_true',
+        dest='audit',
+        help="Let git pass all commits instead of only the non-merge commits \
+which look like corrections, and warn about every line which is neither a \
+correction nor ignored. Bypasses the cache."
+    )
+    parser.add_argument(
+        '--native',
+        action='store_true',
+        dest='native',
+        help="Read the commits directly from the .git object store instead of \
+spawning git log. Falls back to git log if the repository layout is not \
+supported."
+    )
+    parser.add_argument(
+        '--columnar',
+        action='store_true',
+        dest='columnar',
+        help="Keep the per-student data in columns and compute the statistics \
+for all students at once. Uses numpy if it is installed."
+    )
+    parser.add_argument(
+        '--what-if',
+        action='append',
+        dest='whatIf',
+        default=[],
+        metavar='RULE=VALUES',
+        help="Instead of the results, show how many students would be \
+passed, okay, unlikely and failed under different grading rules. RULE is one \
+of MIN_SUBMISSIONS, MAX_UNIT, MIN_POINTS, MAX_POINTS_PER_SUBMISSION and \
+PASS_RATIO (MIN_POINTS as fraction of MAX_POINTS); VALUES is a comma \
+separated list or an inclusive range START:STOP:STEP. If given several \
+times, all combinations are evaluated."
+    )
+    parser.add_argument(
+        '--export',
+        choices=EXPORT_FORMATS,
+        dest='exportFormat',
+        help="Instead of the table, export all computed metrics and the \
+points per unit of every student as JSON Lines, CSV or a binary columnar \
+file (see writeColumnar)."
+    )
+    parser.add_argument(
+        '-o', '--output',
+        dest='outputFile',
+        metavar='FILE',
+        help="Write the export to FILE instead of stdout."
+    )
+    parser.add_argument(
+        '--as-of',
+        type=int,
+        dest='asOf',
+        metavar='UNIT',
+        help="Show the results as they were after UNIT, counting only the \
+corrections of UNIT and the units before."
+    )
+    parser.add_argument(
+        '--series',
+        action='store_true',
+        dest='series',
+        help="Instead of the results, show the number of submissions, the \
+points and the number of passed, okay, unlikely and failed students as of \
+every unit."
+    )
+    parser.add_argument(
+        '--serve',
+        metavar='ADDRESS',
+        help="Keep running, watch the repository for new commits and serve \
+the results on ADDRESS, which is either [HOST:]PORT or the path of a unix \
+socket. The table, CSV and JSON output are available as /table, /csv and \
+/json."
+    )
+    parser.add_argument(
+        '--interval',
+        type=float,
+        default=1.0,
+        help="Seconds between two checks for new commits with --serve."
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        dest='profile',
+        help="Time the phases of the run (reading the history, matching, \
+filtering, aggregation and output) and count the commit lines by their \
+classification. The summary is printed to stderr."
+    )
+    parser.add_argument(
+        '--profile-trace',
+        dest='profileTrace',
+        metavar='FILE',
+        help="Like --profile, and additionally write the phases to FILE in \
+the Chrome trace event format."
+    )
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=None,
+        help="Number of repositories to parse in parallel. Defaults to the \
+number of processors."
+    )
+    parser.add_argument(
+        'repositories',
+        nargs='*',
+        default=['.'],
+        metavar='REPOSITORY',
+        help="Grading repositories to evaluate, defaults to the current \
+directory. The corrections of all repositories are merged; if a student has \
+been corrected for a unit in several repositories, the newest commit counts. \
+A relative --cache path is taken relative to each repository."
+    )
+    args = parser.parse_args(sys.argv[1:])
+    if args.noColor:
+        bcolors.disable(bcolors)
+    try:
+        axes = [parseScenarioAxis(spec) for spec in args.whatIf]
+        scenarios = scenarioGrid(axes)
+    except ValueError as err:
+        parser.error(str(err))
 
-acknowledgements = list(filterAcknowledgements(parseCommits()))
-personData, maxUnit, maxNameLen = getPersonData(acknowledgements)
-if args.csvOutput:
-    print('"Nachname","Punkte","Abgaben","bestanden"')
-    for person in personData:
-        print('"{0}","{1}","{2}","{3}"'.format(person.person, person.pointSum, len(person.submissions), person.passed()))
-else:
-    printData(personData, maxUnit, maxNameLen, args.showState)
+    if args.serve is not None:
+        if len(args.repositories) > 1:
+            parser.error("--serve works on a single repository only")
+        try:
+            address = parseAddress(args.serve)
+        except ValueError as err:
+            parser.error(str(err))
+        serve(EvaluationDaemon(args.native, args.columnar, args.showState, args.interval,
+            args.repositories[0]), address)
+        sys.exit(0)
+
+    if args.exportFormat is not None and (axes or args.series):
+        parser.error("--export cannot be combined with --what-if or --series")
+    if args.cacheFile is not None and os.path.isabs(args.cacheFile) and len(args.repositories) > 1:
+        parser.error("--cache must be a relative path when evaluating several repositories")
+    if args.asOf is not None and not 0 <= args.asOf <= MAX_UNIT:
+        parser.error("--as-of expects a unit between 0 and {0}, got {1}".format(MAX_UNIT, args.asOf))
+
+    profile = Profile() if args.profile or args.profileTrace else None
+    # the acknowledged corrections would end up in the exported data
+    verbose = args.exportFormat is None
+    if args.asOf is not None or args.series:
+        acknowledgements = loadAcknowledgements(args.repositories, args.jobs,
+            audit=args.audit, native=args.native, cachePath=args.cacheFile,
+            verbose=verbose, profile=profile)
+        if profile is None:
+            index = UnitIndex(acknowledgements)
+        else:
+            with profile.phase("UnitIndex"):
+                index = UnitIndex(acknowledgements)
+        if args.asOf is not None:
+            personData = index.snapshot(args.asOf)
+            maxUnit, maxNameLen = personData.maxUnit, personData.maxNameLen
+    else:
+        personData, maxUnit, maxNameLen = loadPersonData(args.repositories, args.jobs,
+            audit=args.audit, native=args.native, cachePath=args.cacheFile,
+            columnar=args.columnar, verbose=verbose, profile=profile)
+    if args.series:
+        output = lambda: printSeries(index, args.csvOutput)
+    elif args.exportFormat is not None:
+        output = lambda: export(personData, maxUnit, args.exportFormat, args.outputFile)
+    elif axes:
+        output = lambda: printSimulation(axes, scenarios, simulate(personData, maxUnit, scenarios), args.csvOutput)
+    elif args.csvOutput:
+        output = lambda: printCsv(personData)
+    else:
+        output = lambda: printData(personData, maxUnit, maxNameLen, args.showState, stream=args.stream)
+    if profile is None:
+        output()
+    else:
+        with profile.phase("printData"):
+            output()
+        sys.stdout.flush()
+        profile.printSummary(sys.stderr)
+        if args.profileTrace is not None:
+            profile.writeTrace(args.profileTrace)
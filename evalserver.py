@@ -0,0 +1,54 @@
+# encoding=utf-8
+"""
+HTTP server for eval.py --serve. Serves the table, CSV and JSON output of an
+evaluation, which is any object with a render(outputFormat) method, over TCP
+or a unix socket.
+"""
+import http.server
+import os
+import socketserver
+
+class EvaluationRequestHandler(http.server.BaseHTTPRequestHandler):
+    ROUTES = {
+        "/": ("table", "text/plain; charset=utf-8"),
+        "/table": ("table", "text/plain; charset=utf-8"),
+        "/csv": ("csv", "text/csv; charset=utf-8"),
+        "/json": ("json", "application/json"),
+    }
+
+    def do_GET(self):
+        try:
+            outputFormat, contentType = self.ROUTES[self.path.partition("?")[0]]
+        except KeyError:
+            self.send_error(404)
+            return
+        body = self.server.evaluation.render(outputFormat).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # unix socket peers have no address
+        return self.client_address[0] if self.client_address else "local"
+
+class EvaluationHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+class EvaluationUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def createServer(evaluation, address):
+    """
+    returns a server for evaluation on address, which is either the path of
+    a unix socket or a tuple (host, port).
+    """
+    if isinstance(address, str):
+        if os.path.exists(address):
+            os.unlink(address)
+        server = EvaluationUnixServer(address, EvaluationRequestHandler)
+    else:
+        server = EvaluationHTTPServer(address, EvaluationRequestHandler)
+    server.evaluation = evaluation
+    return server
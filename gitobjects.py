@@ -0,0 +1,360 @@
+# encoding=utf-8
+"""
+Minimal reader for the git object store, enough to walk the commit graph and
+read commit messages without spawning git.
+
+Only SHA-1 repositories with loose objects and version 2 pack indices are
+supported. Anything else (alternates, shallow or partial clones, linked
+worktrees, other object formats, objects which cannot be found) raises
+Unsupported, so that callers can fall back to the git executable.
+"""
+import heapq
+import itertools
+import mmap
+import os
+import re
+import struct
+import zlib
+
+OBJ_COMMIT = 1
+OBJ_TREE = 2
+OBJ_BLOB = 3
+OBJ_TAG = 4
+OBJ_OFS_DELTA = 6
+OBJ_REF_DELTA = 7
+
+TYPE_NAMES = {
+    b"commit": OBJ_COMMIT,
+    b"tree": OBJ_TREE,
+    b"blob": OBJ_BLOB,
+    b"tag": OBJ_TAG,
+}
+
+IDX_V2_HEADER = b"\377tOc\0\0\0\2"
+
+isSha = re.compile("^[0-9a-f]{40}$", re.I)
+
+class Unsupported(Exception):
+    pass
+
+def readSize(data, pos):
+    size = 0
+    shift = 0
+    while True:
+        c = data[pos]
+        pos += 1
+        size |= (c & 0x7f) << shift
+        shift += 7
+        if not c & 0x80:
+            return size, pos
+
+def applyDelta(base, delta):
+    srcSize, pos = readSize(delta, 0)
+    dstSize, pos = readSize(delta, pos)
+    if srcSize != len(base):
+        raise Unsupported("delta base size mismatch")
+    out = bytearray()
+    while pos < len(delta):
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            offset = 0
+            size = 0
+            for i in range(4):
+                if op & (1 << i):
+                    offset |= delta[pos] << (8*i)
+                    pos += 1
+            for i in range(3):
+                if op & (0x10 << i):
+                    size |= delta[pos] << (8*i)
+                    pos += 1
+            if size == 0:
+                size = 0x10000
+            out += base[offset:offset+size]
+        elif op:
+            out += delta[pos:pos+op]
+            pos += op
+        else:
+            raise Unsupported("invalid delta opcode")
+    if len(out) != dstSize:
+        raise Unsupported("delta result size mismatch")
+    return bytes(out)
+
+def mapFile(path):
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class Pack(object):
+    def __init__(self, idxPath, packPath, store):
+        self.store = store
+        self.idx = mapFile(idxPath)
+        if self.idx[:8] != IDX_V2_HEADER:
+            raise Unsupported("pack index {0} is not version 2".format(idxPath))
+        self.fanout = struct.unpack_from(">256I", self.idx, 8)
+        self.count = self.fanout[255]
+        self.shaTable = 8 + 256*4
+        self.offsetTable = self.shaTable + 24*self.count
+        self.largeOffsetTable = self.offsetTable + 4*self.count
+        self.pack = mapFile(packPath)
+        if self.pack[:4] != b"PACK":
+            raise Unsupported("{0} is not a pack file".format(packPath))
+        self.view = memoryview(self.pack)
+
+    def find(self, binSha):
+        first = binSha[0]
+        lo = self.fanout[first-1] if first > 0 else 0
+        hi = self.fanout[first]
+        idx = self.idx
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = self.shaTable + 20*mid
+            midSha = idx[pos:pos+20]
+            if midSha < binSha:
+                lo = mid + 1
+            elif midSha > binSha:
+                hi = mid
+            else:
+                return self.offsetAt(mid)
+        return None
+
+    def offsetAt(self, i):
+        offset, = struct.unpack_from(">I", self.idx, self.offsetTable + 4*i)
+        if offset & 0x80000000:
+            offset, = struct.unpack_from(">Q", self.idx,
+                self.largeOffsetTable + 8*(offset & 0x7fffffff))
+        return offset
+
+    def inflate(self, pos, size):
+        decompressor = zlib.decompressobj()
+        chunkSize = size + 64
+        parts = []
+        while not decompressor.eof:
+            chunk = self.view[pos:pos+chunkSize]
+            if len(chunk) == 0:
+                raise Unsupported("truncated pack object")
+            parts.append(decompressor.decompress(chunk))
+            pos += chunkSize
+        return b"".join(parts)
+
+    def read(self, offset):
+        pack = self.pack
+        c = pack[offset]
+        objType = (c >> 4) & 7
+        size = c & 0x0f
+        shift = 4
+        pos = offset + 1
+        while c & 0x80:
+            c = pack[pos]
+            pos += 1
+            size |= (c & 0x7f) << shift
+            shift += 7
+
+        if objType == OBJ_OFS_DELTA:
+            c = pack[pos]
+            pos += 1
+            baseDistance = c & 0x7f
+            while c & 0x80:
+                c = pack[pos]
+                pos += 1
+                baseDistance = ((baseDistance + 1) << 7) | (c & 0x7f)
+            baseType, base = self.read(offset - baseDistance)
+            return baseType, applyDelta(base, self.inflate(pos, size))
+        elif objType == OBJ_REF_DELTA:
+            baseType, base = self.store.readBinary(bytes(pack[pos:pos+20]))
+            return baseType, applyDelta(base, self.inflate(pos+20, size))
+        elif objType in (OBJ_COMMIT, OBJ_TREE, OBJ_BLOB, OBJ_TAG):
+            return objType, self.inflate(pos, size)
+        raise Unsupported("unknown pack object type {0}".format(objType))
+
+class Commit(object):
+    def __init__(self, sha, data):
+        self.sha = sha
+        header, _, message = data.partition(b"\n\n")
+        self.parents = []
+        self.time = 0
+        for line in header.split(b"\n"):
+            if line.startswith(b"parent "):
+                self.parents.append(line[7:].decode("ascii"))
+            elif line.startswith(b"committer "):
+                self.time = int(line.rsplit(b" ", 2)[1])
+        self.message = message.decode("utf-8", errors="ignore")
+
+    @property
+    def subject(self):
+        """
+        same as git's %s: the first paragraph, lines joined by spaces.
+        """
+        lines = []
+        for line in self.message.lstrip("\n").split("\n"):
+            line = line.rstrip()
+            if not line:
+                break
+            lines.append(line)
+        return " ".join(lines)
+
+class Repository(object):
+    def __init__(self, gitDir):
+        self.gitDir = gitDir
+        self.checkLayout()
+        self.objectDir = os.path.join(gitDir, "objects")
+        self.packs = []
+        packDir = os.path.join(self.objectDir, "pack")
+        if os.path.isdir(packDir):
+            for filename in sorted(os.listdir(packDir)):
+                if not filename.endswith(".idx"):
+                    continue
+                base = os.path.join(packDir, filename[:-4])
+                if os.path.isfile(base + ".promisor"):
+                    raise Unsupported("partial clones are not supported")
+                if os.path.isfile(base + ".pack"):
+                    self.packs.append(Pack(base + ".idx", base + ".pack", self))
+        self.commits = {}
+
+    @classmethod
+    def discover(cls, path=None):
+        gitDir = os.environ.get("GIT_DIR")
+        if gitDir is not None:
+            return cls(gitDir)
+        path = os.path.abspath(path or os.getcwd())
+        while True:
+            candidate = os.path.join(path, ".git")
+            if os.path.isdir(candidate):
+                return cls(candidate)
+            if os.path.isfile(candidate):
+                raise Unsupported("linked worktrees and submodules are not supported")
+            parent = os.path.dirname(path)
+            if parent == path:
+                raise Unsupported("not inside a git repository")
+            path = parent
+
+    def checkLayout(self):
+        for name in ("commondir", "shallow", os.path.join("objects", "info", "alternates")):
+            if os.path.exists(os.path.join(self.gitDir, name)):
+                raise Unsupported("repositories with {0} are not supported".format(name))
+        try:
+            with open(os.path.join(self.gitDir, "config"), "r") as f:
+                config = f.read().lower()
+        except (IOError, OSError):
+            config = ""
+        if re.search(r"^\s*objectformat\s*=\s*(?!sha1\b)", config, re.M):
+            raise Unsupported("only SHA-1 repositories are supported")
+
+    def readBinary(self, binSha):
+        for pack in self.packs:
+            offset = pack.find(binSha)
+            if offset is not None:
+                return pack.read(offset)
+        sha = binSha.hex()
+        try:
+            with open(os.path.join(self.objectDir, sha[:2], sha[2:]), "rb") as f:
+                data = zlib.decompress(f.read())
+        except (IOError, OSError):
+            raise Unsupported("object {0} not found".format(sha))
+        header, _, body = data.partition(b"\0")
+        typeName, _, _ = header.partition(b" ")
+        try:
+            return TYPE_NAMES[typeName], body
+        except KeyError:
+            raise Unsupported("unknown loose object type {0!r}".format(typeName))
+
+    def read(self, sha):
+        return self.readBinary(bytes.fromhex(sha))
+
+    def commit(self, sha):
+        try:
+            return self.commits[sha]
+        except KeyError:
+            pass
+        objType, data = self.read(sha)
+        while objType == OBJ_TAG:
+            target = data.split(b"\n", 1)[0]
+            if not target.startswith(b"object "):
+                raise Unsupported("malformed tag object {0}".format(sha))
+            objType, data = self.read(target[7:].decode("ascii"))
+        if objType != OBJ_COMMIT:
+            raise Unsupported("{0} is not a commit".format(sha))
+        commit = Commit(sha, data)
+        self.commits[sha] = commit
+        return commit
+
+    def packedRefs(self):
+        refs = {}
+        try:
+            with open(os.path.join(self.gitDir, "packed-refs"), "r") as f:
+                for line in f:
+                    if line.startswith("#") or line.startswith("^"):
+                        continue
+                    sha, _, name = line.rstrip("\n").partition(" ")
+                    refs[name] = sha
+        except (IOError, OSError):
+            pass
+        return refs
+
+    def resolve(self, revision, depth=0):
+        if depth > 5:
+            raise Unsupported("symbolic ref loop at {0}".format(revision))
+        if isSha.match(revision):
+            return revision.lower()
+        if revision != "HEAD" and not revision.startswith("refs/"):
+            raise Unsupported("cannot resolve revision {0}".format(revision))
+        try:
+            with open(os.path.join(self.gitDir, revision), "r") as f:
+                value = f.read().strip()
+        except (IOError, OSError):
+            try:
+                value = self.packedRefs()[revision]
+            except KeyError:
+                raise Unsupported("cannot resolve revision {0}".format(revision))
+        if value.startswith("ref: "):
+            return self.resolve(value[5:], depth + 1)
+        return self.resolve(value, depth + 1)
+
+    def walk(self, include, exclude=()):
+        """
+        yields the commits reachable from any of include but none of exclude,
+        newest committer date first, like git log does without ordering
+        options.
+        """
+        heap = []
+        queued = set()
+        pending = set()
+        uninteresting = set()
+        counter = itertools.count()
+        # number of commits in the heap which are not uninteresting; the walk
+        # is over once only uninteresting ones are left
+        interesting = 0
+
+        def push(sha):
+            nonlocal interesting
+            if sha in queued:
+                return
+            queued.add(sha)
+            pending.add(sha)
+            if sha not in uninteresting:
+                interesting += 1
+            commit = self.commit(sha)
+            heapq.heappush(heap, (-commit.time, next(counter), commit))
+
+        for sha in exclude:
+            uninteresting.add(sha)
+            push(sha)
+        for sha in include:
+            push(sha)
+
+        while heap:
+            if uninteresting and interesting == 0:
+                break
+            _, _, commit = heapq.heappop(heap)
+            pending.discard(commit.sha)
+            if commit.sha in uninteresting:
+                for parent in commit.parents:
+                    if parent in uninteresting:
+                        continue
+                    uninteresting.add(parent)
+                    if parent in pending:
+                        interesting -= 1
+            else:
+                interesting -= 1
+                yield commit
+            for parent in commit.parents:
+                push(parent)